@@ -1,15 +1,19 @@
-import random
 import streamlit as st
 import time
 import re
-from datetime import datetime
-from file_handling.file_reader_folder import extract_texts_from_folder,save_test_plan,download_link
+from file_handling.file_reader_folder import extract_documents_from_folder
+from file_handling.document_export import export_test_plan, hash_plan, DOCX_MIME
+from storage.plan_store import create_plan
 from nlp_pre_processing.keyword_extraction import extract_keywords
-from open_ai.openai_integration_updated import generate_section, list_engines, generate_test_plan_identifier, \
-    extract_main_features_and_criticality, ai_based_testing_estimation, generate_excluded_features_section, \
-    generate_features_to_be_tested_section, generate_staffing_and_training_needs
-from open_ai.openai_integration_updated import generate_test_deliverables_section,generate_environmental_needs_section,generate_schedule_section,generate_responsibilities_section
-from open_ai.openai_integration_updated import generate_introduction_section,generate_glossary_section,generate_remaining_test_tasks
+from nlp_pre_processing.resources import resource_load_times
+from open_ai.openai_integration_updated import get_feature_context
+from open_ai.model_catalog import get_catalog
+from open_ai.backends import get_backend, MOCK_API_KEY
+from open_ai.prompt_builder import set_prompt_token_budget, DEFAULT_PROMPT_TOKEN_BUDGET
+from open_ai.client import set_response_cache_bypass, get_response_cache_stats, set_streaming, get_client
+from open_ai.test_plan_engine import generate_sections, format_person_info, DEFAULT_MAX_WORKERS, TEST_PLAN_SECTIONS
+from open_ai.progress import ProgressReporter, SECTION_STARTED, REQUEST_SENT, TOKENS, RESPONSE_RECEIVED, \
+    SECTION_COMPLETED, SECTION_PERSISTED
 
 
 def sanitize_filename(name):
@@ -19,9 +23,52 @@ def sanitize_filename(name):
 st.title('Automated Test Plan Generator')
 
 # Load OpenAI API key and list available engines
-api_key = st.secrets["OPENAI_API_KEY"]
-engines = list_engines(api_key)
-selected_engine = st.selectbox("Select an OpenAI engine:", engines)
+# OPENAI_BACKEND=mock runs the app offline, against the in-process stand-in of the API
+api_key = st.secrets["OPENAI_API_KEY"] if get_backend().requires_api_key else MOCK_API_KEY
+# Chat models of the key, listed once per hour instead of on every rerun
+model_catalog = get_catalog(api_key)
+selected_engine = st.selectbox("Select an OpenAI engine:", list(model_catalog))
+if selected_engine:
+    model_info = model_catalog[selected_engine]
+    st.caption(f"Context window: {model_info.context_window} tokens | "
+               + (f"Price: ${model_info.input_price}/${model_info.output_price} per 1K input/output tokens | "
+                  if model_info.input_price is not None else "Price: unknown | ")
+               + (f"Average section time: {model_info.average_latency:.1f}s over {model_info.latency_samples} sections"
+                  if model_info.average_latency is not None else "No generation times recorded yet"))
+
+# Identical requests are served from the on-disk response cache unless deliberately re-rolled
+st.sidebar.subheader("Response Cache")
+set_response_cache_bypass(st.sidebar.checkbox("Bypass cache (re-roll all responses)", value=False))
+response_cache_stats_placeholder = st.sidebar.empty()
+st.sidebar.subheader("OpenAI Client")
+client_metrics_placeholder = st.sidebar.empty()
+st.sidebar.subheader("NLP Resources")
+nlp_resources_placeholder = st.sidebar.empty()
+
+
+def display_client_stats():
+    stats = get_response_cache_stats()
+    response_cache_stats_placeholder.caption(
+        f"Hits: {stats['hits']} | Misses: {stats['misses']} | Cached responses: {stats['entries']}")
+    # Requests of every plan share the rate limits of the API key
+    metrics = get_client(api_key).metrics()
+    client_metrics_placeholder.caption(
+        f"Requests: {metrics['requests']} | Retries: {metrics['retries']} | 429s: {metrics['rate_limited']} | "
+        f"Failures: {metrics['failures']} | Queue wait: {metrics['average_queue_wait']:.2f}s avg, "
+        f"{metrics['max_queue_wait']:.2f}s max")
+    # Corpora and models are loaded on first use, once per process
+    load_times = resource_load_times()
+    nlp_resources_placeholder.caption(
+        " | ".join(f"{name}: {seconds:.2f}s" for name, seconds in load_times.items()) if load_times
+        else "No resources loaded yet")
+
+
+display_client_stats()
+
+st.sidebar.subheader("Generation")
+set_streaming(st.sidebar.checkbox("Stream sections while they are generated", value=True))
+set_prompt_token_budget(st.sidebar.number_input("Requirement tokens per prompt (0 = fit the model's context window)",
+                                                min_value=0, value=DEFAULT_PROMPT_TOKEN_BUDGET, step=500))
 
 # Application name and document handling inputs
 def custom_header(text, level=2, size='16px'):
@@ -37,15 +84,6 @@ if 'approvers' not in st.session_state:
 if 'reviewers' not in st.session_state:
     st.session_state['reviewers'] = []
 
-def format_person_info(person):
-    # Handle 'To be Decided' dates and properly formatted dates
-    date = person['date']
-    if date == 'To be Decided':
-        formatted_date = date
-    else:
-        formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
-    return f"Name: {person['name']}, Role: {person['role']}, Date: {formatted_date}"
-
 def add_person(category, name, role, date):
     # Store the date directly if 'To be Decided'
     date_to_store = 'To be Decided' if date == 'To be Decided' else date.strftime('%Y-%m-%d')
@@ -84,16 +122,6 @@ with st.form("reviewers_form"):
         st.success("Reviewer added successfully!")
         display_people('reviewers')
 
-def generate_approvals_text():
-    approvers_text = "Approvers:\n" + "\n".join(format_person_info(person) for person in st.session_state['approvers'])
-    reviewers_text = "Reviewers:\n" + "\n".join(format_person_info(person) for person in st.session_state['reviewers'])
-    return approvers_text + "\n\n" + reviewers_text
-
-
-def generate_version_number():
-    return datetime.now().strftime("%Y%m%d%H%M%S")
-
-
 # Domain and technical stack selections
 
 custom_header("Application Section", level=3, size='22px')
@@ -131,12 +159,7 @@ st.write("Selected Platforms:", ', '.join(selected_platforms))
 
 # Optionally display the selected platforms for confirmation
 
-sections = [
-    "Test Plan Identifier", "References", "Approvals", "Introduction", "Test Items", "Software Risk Issues" "Features to be Tested", "Features not to be Tested", "Functional & Non-functional Testing Approach", "Item Pass/Fail Criteria",
-    "Suspension Criteria and Resumption Requirements", "Test Deliverables", "Remaining Test Tasks", "Test Data Needs",
-    "Environmental Needs", "Staffing and Training Needs", "Responsibilities", "Schedule",
-    "Planning Risks and Contingencies", "Test Estimation", "Glossary"
-]
+sections = TEST_PLAN_SECTIONS
 
 custom_header("Technology Stack", level=3, size='18px')
 
@@ -223,19 +246,31 @@ if 'init' not in st.session_state:
         'features_extracted': False,
         'test_plan_generated': False,
         'file_names': [],
+        'document_texts': [],
+        'extraction_report': [],
         'user_stories_text': '',
         'features': [],
         'criticalities': [],
+        'feature_context': None,
         'keywords': [],
-        'feedback_collected': False
+        'feedback_collected': False,
+        'post_generation': None,
+        'generation_application_name': None,
+        'generation_model': None
     })
 
 def extract_user_stories():
     with st.spinner('Extracting Functional & Non Functional Requirement Texts....'):
         if document_directory:
-            extracted_texts, file_names = extract_texts_from_folder(document_directory)
+            # Documents are parsed in parallel; unchanged files come from the extraction cache
+            documents = extract_documents_from_folder(document_directory)
+            extracted_texts = [document['Text'] for document in documents if document['Text']]
+            file_names = [document['File'] for document in documents if document['Text']]
+            st.session_state.extraction_report = [{key: value for key, value in document.items() if key != 'Text'}
+                                                  for document in documents]
             if extracted_texts:
                 st.session_state.user_stories_text = "\n\n".join(extracted_texts)
+                st.session_state.document_texts = extracted_texts
                 st.session_state.file_names = file_names
                 st.session_state.texts_extracted = True
                 st.success("Requirements Text successfully extracted from requirements & design documents Provided.")
@@ -244,6 +279,15 @@ def extract_user_stories():
         else:
             st.warning("Please enter a valid directory path.")
 
+def display_extraction_report():
+    report = st.session_state.get('extraction_report')
+    if report:
+        parsed = sum(1 for document in report if not document['Cached'])
+        failed = sum(1 for document in report if document['Error'])
+        with st.expander(f"Document Extraction Report ({len(report)} files, {parsed} parsed, "
+                         f"{len(report) - parsed} cached, {failed} failed)"):
+            st.dataframe(report)
+
 def display_extracted_info():
     if 'features_extracted' in st.session_state and st.session_state.features_extracted:
         features_list = "\n".join(f"- {feature} (Criticality: {crit})" for feature, crit in zip(st.session_state.features, st.session_state.criticalities))
@@ -255,12 +299,18 @@ def display_extracted_info():
 
 def extract_features_and_keywords():
     if st.session_state.user_stories_text:
-        features, criticalities = extract_main_features_and_criticality(selected_engine, st.session_state.user_stories_text, api_key)
-        keywords = extract_keywords(st.session_state.user_stories_text)
+        # Computed once per plan and shared by every section generator
+        feature_context = get_feature_context(selected_engine, st.session_state.user_stories_text, api_key,
+                                              documents=st.session_state.get('document_texts'))
+        features, criticalities = feature_context.features, feature_context.criticalities
+        keywords = extract_keywords(st.session_state.user_stories_text,
+                                    documents=st.session_state.get('document_texts'))
+        display_client_stats()
         if features and criticalities and keywords:
             st.session_state.update({
                 'features': features,
                 'criticalities': criticalities,
+                'feature_context': feature_context,
                 'keywords': keywords,
                 'features_extracted': True
             })
@@ -273,6 +323,7 @@ def extract_features_and_keywords():
 if not st.session_state.get('texts_extracted', False):
     if st.button("Extract Requirements"):
         extract_user_stories()
+display_extraction_report()
 
 # Button to extract features and keywords
 if st.session_state.get('texts_extracted', False) and not st.session_state.get('features_extracted', False):
@@ -289,24 +340,47 @@ section_details = []
 def generate_test_plan_section():
     overall_progress_placeholder = st.empty()
     section_status_placeholder = st.empty()
-    local_progress_placeholder = st.empty()
     user_stories_text = st.session_state.user_stories_text
     features = st.session_state.features
     criticalities = st.session_state.criticalities
     keywords = st.session_state.keywords
     file_names = st.session_state.file_names
-    # Function to simulate the generation of a section
-    def generate_section_progress(section_name, index, total_sections):
-        section_status_placeholder.info(f"Generating Section: **{section_name}**...")
-        local_progress = local_progress_placeholder.progress(0)
-        steps = 10  # Number of steps within each section generation
-
-        for step in range(steps):
-            time.sleep(0.1)  # Simulate some processing time
-            local_progress.progress((step + 1) / steps)
+    section_progress = {}
+    section_placeholders = {}
+    streamed_texts = {}
+
+    # Progress is driven by the events of the section workers, never by timers
+    def handle_progress(event):
+        state = section_progress.setdefault(event.section, {'status': 'Queued', 'sent': 0, 'received': 0})
+        if event.kind == SECTION_STARTED:
+            state['status'] = 'Generating'
+        elif event.kind == REQUEST_SENT:
+            state['sent'] += 1
+        elif event.kind == TOKENS:
+            # Render the section incrementally until its final content replaces the stream; the concurrent
+            # sub-requests of a section (e.g. one per test type) stream into parts of their own
+            parts = streamed_texts.setdefault(event.section, {})
+            subrequest = event.data.get('subrequest', ())
+            parts[subrequest] = parts.get(subrequest, '') + event.data['text']
+            if state['status'] == 'Generating':
+                section_placeholders[event.section].markdown("\n\n".join(parts[key] for key in sorted(parts)))
+            return
+        elif event.kind == RESPONSE_RECEIVED:
+            state['received'] += 1
+        elif event.kind == SECTION_COMPLETED:
+            state['status'] = 'Generated'
+        elif event.kind == SECTION_PERSISTED:
+            state['status'] = 'Completed'
+        persisted = sum(1 for s in section_progress.values() if s['status'] == 'Completed')
+        overall_progress_placeholder.progress(persisted / total_sections)
+        in_flight = [f"**{name}** ({s['received']}/{s['sent']} responses received)"
+                     for name, s in section_progress.items() if s['status'] == 'Generating']
+        if in_flight:
+            section_status_placeholder.info("Generating Sections: " + ", ".join(in_flight))
+        else:
+            section_status_placeholder.success(f"Completed Section: **{event.section}** ✔️")
 
-        overall_progress_placeholder.progress((index + 1) / total_sections)
-        section_status_placeholder.success(f"Completed Section: **{section_name}** ✔️")
+    reporter = ProgressReporter(handle_progress)
 
     urls_list = reference_urls.split(',') if reference_urls else []
     options = {
@@ -330,130 +404,28 @@ def generate_test_plan_section():
     }
     with st.spinner('Please wait...Processing!'):
         st.markdown(F"## Test Plan for Application: {application_name} ")
-        for index, section in enumerate(sections):
-            start_time_sec = time.time()
-            local_progress_placeholder = st.empty()
-            # Display generating status
-            section_status_placeholder = st.empty()
-            section_status_placeholder.info(f"Generating Section: **{section}**...")
-            local_progress = local_progress_placeholder.progress(0)
-            with st.spinner("Please wait...Processing....."):
-                st.subheader(section)
-                if section == "Test Plan Identifier":
-                    test_plan_iden = generate_test_plan_identifier(selected_engine, api_key, options, retries=5,
-                                                                   base_delay=1.0)
-                    full_test_plan[section] = test_plan_iden
-                elif section == "References":
-                    references_text = "Documents:\n"
-                    if options['file_names']:
-                        references_text += "\n".join(
-                            f"{i + 1}. {name}" for i, name in enumerate(options['file_names']))
-                    else:
-                        references_text += "No documents available."
-
-                    if options['urls']:
-                        references_text += "\n\nReferenced URLs:\n" + "\n".join(
-                            f"{i + 1}. {url}" for i, url in enumerate(options['urls']))
-                    else:
-                        references_text += "\n\nNo referenced URLs provided."
-
-                    full_test_plan['References'] = references_text
-                elif section == "Approvals":
-                    approvals_text = ""
-                    if 'approvers' in st.session_state and 'reviewers' in st.session_state:
-                        approvals_text = generate_approvals_text()
-                    full_test_plan[section] = approvals_text
-                elif section == "Test Estimation":
-                    estimation_texts = []
-                    estimation_texts.append(
-                        ai_based_testing_estimation(selected_engine, user_stories_text, features,
-                                                    num_testers, "Functional Testing", api_key))
-                    if test_automation:
-                        estimation_texts.append(
-                            ai_based_testing_estimation(selected_engine, user_stories_text, features,
-                                                        num_automation_testers, "Automation Testing", api_key))
-                    else:
-                        estimation_texts.append(
-                            "Estimation for Automation Testing was not done as it was not chosen to be estimated.")
-                    if performance_testing:
-                        estimation_texts.append(
-                            ai_based_testing_estimation(selected_engine, user_stories_text, features,
-                                                        num_performance_testers, "Performance Testing", api_key))
-                    else:
-                        estimation_texts.append(
-                            "Estimation for Security Testing was not done as it was not chosen to be estimated.")
-                    if security_testing:
-                        estimation_texts.append(
-                            ai_based_testing_estimation(selected_engine, user_stories_text, features,
-                                                        num_security_testers, "Security Testing", api_key))
-                    else:
-                        estimation_texts.append(
-                            "Estimation for Security Testing was not done as it was not chosen to be estimated.")
-                    full_test_plan[section] = "\n\n".join(estimation_texts)
-                elif section == "Features not to be Tested":
-                    excluded_features_text = generate_excluded_features_section(
-                        selected_engine,
-                        "Features not to be Tested",
-                        user_stories_text,
-                        features,
-                        api_key,
-                        options
-                    )
-                    full_test_plan[section] = excluded_features_text
-                elif section == "Features to be Tested":
-                    included_features_text = generate_features_to_be_tested_section(selected_engine,
-                                                                                    user_stories_text, api_key,
-                                                                                    options)
-                    full_test_plan[section] = included_features_text
-                elif section == "Test Deliverables":
-                    deliverables_text = generate_test_deliverables_section(selected_engine, api_key, options)
-                    full_test_plan[section] = deliverables_text
-                elif section == "Environmental Needs":
-                    environmental_needs_text = generate_environmental_needs_section(selected_engine, api_key,
-                                                                                    options)
-                    full_test_plan[section] = environmental_needs_text
-                elif section == "Schedule":
-                    schedule_section = generate_schedule_section(selected_engine, api_key, options)
-                    full_test_plan[section] = schedule_section
-                elif section == "Responsibilities":
-                    responsibility_section = generate_responsibilities_section(selected_engine, api_key, options)
-                    full_test_plan[section] = responsibility_section
-
-                elif section == "Introduction":
-                    intro_section = generate_introduction_section(selected_engine, api_key, options)
-                    full_test_plan[section] = intro_section
-                elif section == "Staffing and Training Needs":
-                    staffing_needs = generate_staffing_and_training_needs(selected_engine, user_stories_text,
-                                                                          features, api_key, options)
-                    full_test_plan[section] = staffing_needs
-                elif section == "Glossary":
-                    glossery_section = generate_glossary_section(selected_engine, api_key, user_stories_text)
-                    full_test_plan[section] = glossery_section
-                elif section == "Remaining Test Tasks":
-                    remaing_section = generate_remaining_test_tasks(selected_engine, api_key, user_stories_text,
-                                                                    options)
-                    full_test_plan[section] = remaing_section
-                else:
-                    full_test_plan[section] = generate_section(selected_engine, section, user_stories_text, api_key,
-                                                               options)
-                steps = 10  # Number of steps within each section generation
-                for step in range(steps):
-                    time.sleep(random.random())  # Simulate some processing time
-                    local_progress.progress((step + 1) / steps)
-            local_progress.progress(100)
-            overall_progress_placeholder.progress((index + 1) / total_sections)
-            section_status_placeholder.success(f"Completed Section: **{section}** ✔️")
-            # Clear local progress
+        # One placeholder per section, in document order, so streamed sections appear in place
+        for section in sections:
+            st.subheader(section)
+            section_placeholders[section] = st.empty()
+        # Sections are generated concurrently and handed back in document order
+        for index, section, content, timings in generate_sections(sections, selected_engine, api_key,
+                                                                   user_stories_text, options,
+                                                                   feature_context=st.session_state.get('feature_context'),
+                                                                   max_workers=DEFAULT_MAX_WORKERS,
+                                                                   reporter=reporter):
+            full_test_plan[section] = content
             word_count = len(full_test_plan[section].split())
-            end_time_sec = time.time()
-            section_time = end_time_sec - start_time_sec
             section_details.append({
                 "Section": section,
                 "Content": full_test_plan[section],
                 "Word Count": word_count,
-                "Generation Time":section_time
+                **timings
             })
-            st.write(full_test_plan[section])
+            reporter.emit(section, SECTION_PERSISTED)
+            reporter.dispatch()
+            section_placeholders[section].write(full_test_plan[section])
+    display_client_stats()
     st.session_state['full_test_plan'] = full_test_plan
     st.session_state['section_details'] = section_details
     return full_test_plan, section_details
@@ -480,31 +452,11 @@ def generate_test_plan():
     return st.session_state['full_test_plan'], st.session_state['section_details']
 
 
-import json
-import os
-
-
-def save_test_plan_data(section_details, application_name):
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    base_dir = "output/feedback"  # Base directory for feedback
-    app_dir = os.path.join(base_dir, sanitize_filename(application_name))  # App-specific directory
-    # Ensure the app-specific directory exists, if not, create it
-    os.makedirs(app_dir, exist_ok=True)
-    # Define the filename for the JSON file
-    filename_json = os.path.join(app_dir, f'{sanitize_filename(application_name)}_{timestamp}_test_plan_data.json')
-    # Data to be saved
-    data = {
-        'application_name': application_name,
-        'section_details': section_details
-    }
-    # Save data to JSON file
-    with open(filename_json, 'w') as f:
-        json.dump(data, f)
-    return filename_json
-
-
 if st.session_state.get('features_extracted', False) and not st.session_state.get('test_plan_generated', False):
     if st.button("Generate Test Plan"):
+        # The plan is saved under the name and model it was generated with, even if the inputs change later
+        st.session_state['generation_application_name'] = application_name
+        st.session_state['generation_model'] = selected_engine
         start_time = time.time()
         full_test_plan, section_details = generate_test_plan()
         end_time = time.time()
@@ -519,9 +471,12 @@ def initialize_session_state():
     st.session_state['features_extracted'] = False
     st.session_state['test_plan_generated'] = False
     st.session_state['file_names'] = []
+    st.session_state['document_texts'] = []
+    st.session_state['extraction_report'] = []
     st.session_state['user_stories_text'] = ''
     st.session_state['features'] = []
     st.session_state['criticalities'] = []
+    st.session_state['feature_context'] = None
     st.session_state['keywords'] = []
     st.session_state['approvers'] = []
     st.session_state['reviewers'] = []
@@ -529,83 +484,54 @@ def initialize_session_state():
     st.session_state.feedback_data = []
     st.session_state['full_test_plan'] = {}
     st.session_state['section_details'] = []
+    st.session_state['post_generation'] = None
+    st.session_state['generation_application_name'] = None
+    st.session_state['generation_model'] = None
 
 def reset_app():
         st.session_state.clear()
         initialize_session_state()
         st.experimental_rerun()
-import subprocess
-
-
-def launch_feedback_app(data_filename, session_id, doc_gen_id, model_used):
-    # Command to run the feedback application with the filename argument
-    subprocess.Popen(['streamlit', 'run', 'feedback_app_integrated.py', '--', data_filename, session_id, doc_gen_id, model_used])
-
-import sqlite3
-import uuid
-
-def create_connection(db_file):
-    """ create a database connection to a SQLite database """
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file)
-        return conn
-    except Exception as e:
-        print(e)
-    return conn
-
-def create_table(conn):
-    """ create a table to store sessions, application names, and model details """
-    try:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id TEXT PRIMARY KEY,
-                application_name TEXT,
-                model_used TEXT,
-                doc_gen_id TEXT,
-                filename TEXT
-            )
-        ''')
-        conn.commit()
-    except Exception as e:
-        print(e)
-
-def save_session_data(conn, application_name, model_used, filename):
-    """ save session data including application name, model used, and filename """
-    session_id = str(uuid.uuid4())
-    doc_gen_id = str(uuid.uuid4())  # Assuming you generate a unique ID for each document generation
-    c = conn.cursor()
-    c.execute('INSERT INTO sessions (session_id, application_name, model_used, doc_gen_id, filename) VALUES (?, ?, ?, ?, ?)',
-              (session_id, application_name, model_used, doc_gen_id, filename))
-    conn.commit()
-    return session_id, doc_gen_id
-
-def get_session_details(conn, session_id):
-    """ retrieve session details by session_id """
-    c = conn.cursor()
-    c.execute('SELECT application_name, model_used, doc_gen_id, filename FROM sessions WHERE session_id = ?', (session_id,))
-    result = c.fetchone()
-    return result if result else None
-
-# Main code to use the functions
-db_file = 'session_data.db'
-conn = create_connection(db_file)
-create_table(conn)
+
+FEEDBACK_PAGE = 'Feedback'  # pages/1_Feedback.py
+
+
+def run_post_generation(full_test_plan, section_details, application_name, model_used):
+    """Persist the artifacts of a generated plan exactly once and return the post-generation state.
+
+    The state is keyed by the plan ID (the hash of the plan), so reruns of the same plan
+    only read it back; a different plan gets its own session, plan and sections rows.
+    """
+    plan_id = hash_plan(full_test_plan, application_name, model_used)
+    post_generation = st.session_state.get('post_generation')
+    if post_generation and post_generation['plan_id'] == plan_id:
+        return post_generation
+    exported_plan = export_test_plan(full_test_plan, application_name, model_used)
+    # The session, the plan and its sections are written in one transaction
+    session_id, doc_gen_id = create_plan(application_name, model_used, exported_plan.path, section_details,
+                                         plan_hash=plan_id)
+    post_generation = {
+        'plan_id': plan_id,
+        'exported_plan': exported_plan,
+        'session_id': session_id,
+        'doc_gen_id': doc_gen_id,
+        # The Feedback page of this app serves every plan, resolving it from the session id
+        'feedback_url': f"{FEEDBACK_PAGE}?session_id={session_id}",
+    }
+    st.session_state['post_generation'] = post_generation
+    return post_generation
 
 
 if st.session_state.get('test_plan_generated', False):
-    doc = save_test_plan(full_test_plan, application_name, selected_engine)
-    version_number = generate_version_number()
-    filename = f"{sanitize_filename(application_name)}_v{version_number}_Test_Plan.docx"
-    link = download_link(doc, filename, "Download Test Plan as Word Document")
-    st.markdown(link, unsafe_allow_html=True)
     full_test_plan, section_details = generate_test_plan()
-    data_filename = save_test_plan_data(section_details, application_name)
-    session_id, doc_gen_id = save_session_data(conn,application_name, selected_engine, data_filename)
-    feedback_url = f"http://localhost:8502?session_id={session_id}"
-    st.markdown(f"[Launch Feedback App]({feedback_url})", unsafe_allow_html=True)
-    launch_feedback_app(data_filename, session_id, doc_gen_id,selected_engine)
-    st.success('Feedback app is prepared. Click the link above to start providing feedback.')
+    generated_application_name = st.session_state['generation_application_name']
+    post_generation = run_post_generation(full_test_plan, section_details, generated_application_name,
+                                          st.session_state['generation_model'])
+    exported_plan = post_generation['exported_plan']
+    filename = f"{sanitize_filename(generated_application_name)}_v{exported_plan.version}_Test_Plan.docx"
+    st.download_button("Download Test Plan as Word Document", data=exported_plan.data, file_name=filename,
+                       mime=DOCX_MIME)
+    st.markdown(f"[Launch Feedback App]({post_generation['feedback_url']})", unsafe_allow_html=True)
+    st.success('Feedback page is prepared. Click the link above to start providing feedback.')
     if st.button("Reset Application"):
         reset_app()
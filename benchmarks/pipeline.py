@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+# Corpus sizes (number of documents) benchmarked by default, and the words of each document
+DEFAULT_SIZES = [5, 25, 100]
+DEFAULT_WORDS_PER_DOCUMENT = 400
+DEFAULT_ENGINE = 'gpt-3.5-turbo'
+# Mock latencies are scaled down so a run measures the pipeline rather than the fitted API latency
+DEFAULT_LATENCY_SCALE = 0.01
+# Client rate limits of the benchmarked model; far above what a run uses unless set lower to exercise the limiter
+DEFAULT_REQUESTS_PER_MINUTE = 1000000
+DEFAULT_TOKENS_PER_MINUTE = 1000000000
+RSS_SAMPLE_INTERVAL = 0.01
+
+STAGES = ['extract', 'keywords', 'features', 'sections', 'export', 'persist']
+
+ROLES = ['user', 'administrator', 'auditor', 'guest', 'support agent', 'account owner']
+ACTIONS = ['log in with', 'reset', 'export', 'share', 'search for', 'archive', 'import', 'approve', 'review',
+           'synchronize', 'encrypt', 'restore']
+OBJECTS = ['passwords', 'vault entries', 'audit logs', 'user accounts', 'reports', 'attachments', 'backups',
+           'team folders', 'security keys', 'notifications', 'access policies', 'sessions']
+CONDITIONS = ['within two seconds', 'from a mobile device', 'without losing data', 'while offline',
+              'after two-factor authentication', 'for up to 10000 records', 'with an audit trail']
+
+
+def make_corpus(directory, documents, words_per_document=DEFAULT_WORDS_PER_DOCUMENT, seed=0):
+    """Write documents synthetic requirement files (user stories with acceptance criteria) and return their bytes."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    total_bytes = 0
+    for index in range(documents):
+        lines = [f"# Requirements {index + 1}"]
+        words = 0
+        story = 0
+        while words < words_per_document:
+            story += 1
+            role, action, obj = rng.choice(ROLES), rng.choice(ACTIONS), rng.choice(OBJECTS)
+            text = (f"User story {index + 1}.{story}: As a {role}, I want to {action} {obj} "
+                    f"{rng.choice(CONDITIONS)} so that my {rng.choice(OBJECTS)} stay consistent.\n"
+                    f"Acceptance criteria: the system must {action} {obj} {rng.choice(CONDITIONS)} "
+                    f"and report failures to the {rng.choice(ROLES)}.")
+            lines.append(text)
+            words += len(text.split())
+        path = os.path.join(directory, f"requirements_{index + 1:04d}.{'md' if index % 2 else 'txt'}")
+        with open(path, 'w') as f:
+            f.write("\n\n".join(lines))
+        total_bytes += os.path.getsize(path)
+    return total_bytes
+
+
+def _current_rss():
+    """Resident set size of this process in bytes, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class RSSSampler:
+    """Samples the resident set size in a background thread and keeps the peak since the last reset."""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = _current_rss() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss() or 0)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def reset(self):
+        self.peak = _current_rss() or 0
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def peak_mb(self):
+        peak = max(self.peak, _current_rss() or 0)
+        if not peak:  # No /proc: fall back to the high-water mark of the whole process (KB on Linux)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return peak / (1024 * 1024)
+
+
+def run_stage(stages, name, sampler, func, items=None, unit=None):
+    """Run one stage, record its latency, peak RSS and throughput in stages[name] and return its result.
+
+    items is a function of the stage's result giving the number of units it processed. A
+    failed stage records its error and returns None, so the stages after it still run.
+    """
+    sampler.reset()
+    start_time = time.perf_counter()
+    result, error = None, None
+    try:
+        result = func()
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        print(f"Stage {name} failed: {error}")
+    seconds = time.perf_counter() - start_time
+    stage = {'seconds': round(seconds, 6), 'peak_rss_mb': round(sampler.peak_mb(), 2)}
+    if error is None and items is not None:
+        count = items(result)
+        stage.update({'items': count, 'unit': unit, 'throughput': round(count / seconds, 3) if seconds else None})
+    if error is not None:
+        stage['error'] = error
+    stages[name] = stage
+    return result
+
+
+def benchmark_pipeline(corpus_directory, corpus_bytes, engine, sampler, max_workers=None):
+    """Run the whole generation path on one corpus and return the measurements of every stage."""
+    from file_handling.file_reader_folder import extract_texts_from_folder
+    from file_handling.document_export import export_test_plan
+    from nlp_pre_processing.keyword_extraction import extract_keywords
+    from open_ai.backends import MOCK_API_KEY
+    from open_ai.openai_integration_updated import get_feature_context
+    from open_ai.test_plan_engine import generate_sections, TEST_PLAN_SECTIONS, DEFAULT_MAX_WORKERS
+    from storage.plan_store import create_plan
+    from testplan.batch import plan_options
+
+    application = {'name': 'Benchmark', 'created_by': 'benchmark', 'domain': 'Privacy & Security',
+                   'team': {'testers': 4, 'test_leads': 1, 'test_managers': 1, 'automation_testers': 2,
+                            'performance_testers': 1, 'security_testers': 1}}
+    stages = {}
+    start_time = time.perf_counter()
+    texts, file_names = run_stage(stages, 'extract', sampler,
+                                  lambda: extract_texts_from_folder(corpus_directory, use_cache=False),
+                                  items=lambda result: corpus_bytes / (1024 * 1024), unit='MB') or ([], [])
+    user_stories_text = "\n\n".join(texts)
+    words = len(user_stories_text.split())
+    keywords = run_stage(stages, 'keywords', sampler, lambda: extract_keywords(user_stories_text, documents=texts),
+                         items=lambda result: words, unit='words') or []
+    feature_context = run_stage(stages, 'features', sampler,
+                                lambda: get_feature_context(engine, user_stories_text, MOCK_API_KEY, documents=texts),
+                                items=lambda result: words, unit='words')
+    if feature_context is None:
+        return stages, time.perf_counter() - start_time, words
+    options = plan_options(application, file_names, feature_context, keywords)
+
+    def generate():
+        full_test_plan, section_details = {}, []
+        for _, section, content, timings in generate_sections(TEST_PLAN_SECTIONS, engine, MOCK_API_KEY,
+                                                             user_stories_text, options,
+                                                             feature_context=feature_context,
+                                                             max_workers=max_workers or DEFAULT_MAX_WORKERS):
+            full_test_plan[section] = content
+            section_details.append({"Section": section, "Content": content, "Word Count": len(content.split()),
+                                    **timings})
+        return full_test_plan, section_details
+
+    plan = run_stage(stages, 'sections', sampler, generate, items=lambda result: len(result[1]), unit='sections')
+    if plan is not None:
+        full_test_plan, section_details = plan
+        stages['sections']['completion_tokens'] = sum(detail.get("Completion Tokens") or 0
+                                                      for detail in section_details)
+        # Sections served from the cache have no latencies of their own and are left out of the averages
+        stages['sections']['cached_sections'] = sum(1 for detail in section_details if detail.get("Cached"))
+        for key, metric in (('average_time_to_first_token', "Time to First Token"),
+                            ('average_tokens_per_second', "Tokens per Second")):
+            values = [detail[metric] for detail in section_details if detail.get(metric) is not None]
+            stages['sections'][key] = round(sum(values) / len(values), 3) if values else None
+
+        def export():
+            exported_plan = export_test_plan(full_test_plan, application['name'], engine)
+            exported_plan.saved.result()
+            return exported_plan
+
+        exported_plan = run_stage(stages, 'export', sampler, export, items=lambda result: len(result.data) / 1024,
+                                  unit='KB')
+        if exported_plan is not None:
+            run_stage(stages, 'persist', sampler,
+                      lambda: create_plan(application['name'], engine, exported_plan.path, section_details,
+                                          plan_hash=exported_plan.plan_hash),
+                      items=lambda result: len(section_details), unit='sections')
+    return stages, time.perf_counter() - start_time, words
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, words_per_document=DEFAULT_WORDS_PER_DOCUMENT, repeat=1,
+                   engine=DEFAULT_ENGINE, latency_scale=DEFAULT_LATENCY_SCALE, seed=0, max_workers=None,
+                   requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE):
+    """Benchmark the pipeline on corpora of every size against the mock backend and return the results.
+
+    Runs happen in a temporary working directory, removed afterwards, so every cache,
+    database and exported plan starts empty and the repository's own are left alone. The
+    mock latencies are fitted to the repository's feedback data before that, read-only.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    from open_ai.backends import fit_latency_profiles, MockBackend, set_backend, MOCK_API_KEY
+    # The feedback data lives under the repository root whatever the working directory; it is only read
+    profiles = fit_latency_profiles()
+    working_directory = tempfile.mkdtemp(prefix='testplan-benchmark-')
+    previous_directory = os.getcwd()
+    os.chdir(working_directory)
+    sampler = RSSSampler().start()
+    try:
+        from open_ai.client import set_response_cache_bypass, set_streaming, configure_rate_limits, get_client
+        set_backend(MockBackend(profiles=profiles, latency_scale=latency_scale, seed=seed))
+        set_response_cache_bypass(True)
+        set_streaming(True)
+        configure_rate_limits(engine, requests_per_minute, tokens_per_minute)
+        client = get_client(MOCK_API_KEY)
+        runs = []
+        for documents in sizes:
+            for iteration in range(repeat):
+                corpus_directory = os.path.join(working_directory, f"corpus_{documents}_{iteration}")
+                # Every run gets its own corpus, so no stage is served from another run's cache
+                corpus_bytes = make_corpus(corpus_directory, documents, words_per_document,
+                                           seed=seed * 1000003 + documents * 1009 + iteration)
+                metrics_before = client.metrics()
+                stages, seconds, words = benchmark_pipeline(corpus_directory, corpus_bytes, engine, sampler,
+                                                            max_workers)
+                metrics_after = client.metrics()
+                # Requests, retries and rate limiter waits of this run
+                requests = {name: round(metrics_after[name] - metrics_before[name], 6)
+                            for name in ('requests', 'retries', 'rate_limited', 'failures', 'queue_wait')}
+                runs.append({'documents': documents, 'words': words, 'bytes': corpus_bytes, 'iteration': iteration,
+                             'total_seconds': round(seconds, 6), 'stages': stages, 'requests': requests})
+                print(f"{documents} documents, run {iteration + 1}: {seconds:.2f}s "
+                      + ", ".join(f"{name} {stage['seconds']:.3f}s" for name, stage in stages.items()))
+    finally:
+        sampler.stop()
+        os.chdir(previous_directory)
+        shutil.rmtree(working_directory, ignore_errors=True)
+    return {
+        'benchmark': 'pipeline',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'sizes': list(sizes), 'words_per_document': words_per_document, 'repeat': repeat,
+                   'engine': engine, 'backend': 'mock', 'latency_scale': latency_scale, 'seed': seed,
+                   'max_workers': max_workers, 'requests_per_minute': requests_per_minute,
+                   'tokens_per_minute': tokens_per_minute},
+        'runs': runs,
+    }
+
+
+def summarize(results):
+    """Return {(documents, stage): median seconds} over the runs of a result file."""
+    seconds = {}
+    for run in results['runs']:
+        for name, stage in run['stages'].items():
+            seconds.setdefault((run['documents'], name), []).append(stage['seconds'])
+    return {key: sorted(values)[len(values) // 2] for key, values in seconds.items()}
+
+
+def compare(results, baseline):
+    """Print the median latency of every size and stage next to the baseline's."""
+    current, previous = summarize(results), summarize(baseline)
+    print(f"{'documents':>9}  {'stage':<9} {'baseline':>10} {'current':>10} {'change':>8}")
+    for (documents, name) in sorted(current, key=lambda key: (key[0], STAGES.index(key[1]))):
+        before, after = previous.get((documents, name)), current[(documents, name)]
+        change = f"{(after - before) / before:+.1%}" if before else 'n/a'
+        print(f"{documents:>9}  {name:<9} {before if before is not None else float('nan'):>10.3f} "
+              f"{after:>10.3f} {change:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.pipeline',
+                                     description="Benchmark the test plan pipeline on synthetic corpora.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Documents per corpus")
+    parser.add_argument('--words', type=int, default=DEFAULT_WORDS_PER_DOCUMENT, help="Words per document")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per corpus size")
+    parser.add_argument('--engine', default=DEFAULT_ENGINE, help="Model whose latency profile the mock uses")
+    parser.add_argument('--latency-scale', type=float, default=DEFAULT_LATENCY_SCALE,
+                        help="Factor applied to the mock API latencies (1 = as fitted to the feedback data)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-workers', type=int, default=None, help="Sections generated at the same time")
+    parser.add_argument('--requests-per-minute', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="Client rate limit of the model")
+    parser.add_argument('--tokens-per-minute', type=int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help="Client token rate limit of the model")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument('--baseline', help="Earlier result file to compare with")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.words, args.repeat, args.engine, args.latency_scale, args.seed,
+                             args.max_workers, args.requests_per_minute, args.tokens_per_minute)
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results saved to {output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
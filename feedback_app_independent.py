@@ -1,40 +1,31 @@
 import streamlit as st
-import pandas as pd
 import json
-import sqlite3
-from datetime import datetime
 import os
 
-
-def connect_db():
-    """Connect to the SQLite database."""
-    return sqlite3.connect('session_data.db')
+from storage import plan_store
+from storage.session_store import get_session_store
 
 
 def get_applications():
     """Retrieve all unique applications from the database."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT application_name FROM sessions")
-    apps = cursor.fetchall()
-    conn.close()
-    return [app[0] for app in apps]
+    return get_session_store().get_applications()
 
 
 def get_sessions_for_app(application_name):
     """Retrieve all sessions for a given application."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT session_id, doc_gen_id, model_used, filename FROM sessions WHERE application_name = ?",
-                   (application_name,))
-    sessions = cursor.fetchall()
-    conn.close()
-    return sessions
+    return get_session_store().get_sessions_for_app(application_name)
+
+
+def get_session(session_id):
+    """Retrieve the application name of a session, or None if the session does not exist."""
+    session = get_session_store().get_session(session_id)
+    return session[0] if session else None
 
 
 def load_test_plan_data(filename):
     """Load the JSON data from the specified file."""
-    with open(filename, 'r') as f:
+    # Sessions saved on Windows store their paths with backslashes
+    with open(filename.replace('\\', os.sep), 'r') as f:
         return json.load(f)
 
 
@@ -44,42 +35,46 @@ def sanitize_filename(name):
     return re.sub(r'[^\w\s-]', '', name).strip()
 
 
-def save_feedback(feedback_data, application_name, model_used):
-    """Save feedback data to a CSV file, including the model used."""
-    base_dir = "output/feedback"
-    app_dir = os.path.join(base_dir, sanitize_filename(application_name))
-    os.makedirs(app_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    filename = f"{sanitize_filename(application_name)}_test_plan_feedback_{timestamp}.csv"
-    full_path = os.path.join(app_dir, filename)
+def save_feedback(feedback_data, plan_id, model_used):
+    """Save feedback data to the plan store, including the model used."""
+    feedback_id = plan_store.save_feedback(plan_id, model_used, feedback_data)
+    st.success(f"Feedback submitted successfully and saved as feedback #{feedback_id}.")
 
-    # Include the model info in the feedback DataFrame
-    feedback_df = pd.DataFrame(feedback_data)
-    feedback_df['Model Used'] = model_used  # Add a new column with the model info
 
-    # Save the DataFrame to a CSV file
-    feedback_df.to_csv(full_path, index=False)
-    st.success(f"Feedback submitted successfully and saved to '{full_path}'.")
+def load_section_details(session_id, doc_gen_id, application_name, model_used, filename):
+    """Load the sections of a plan from the plan store, importing plans that were kept as JSON files."""
+    section_details = plan_store.get_section_details(doc_gen_id)
+    if section_details is None:
+        section_details = load_test_plan_data(filename)['section_details']
+        plan_store.import_plan(session_id, doc_gen_id, application_name, model_used, section_details)
+    return section_details
 
 
 def feedback_app():
     st.title("Test Plan Feedback Application")
 
+    # The main app links here with ?session_id=..., which preselects that plan
+    linked_session_id = st.query_params.get('session_id')
+    linked_application = get_session(linked_session_id) if linked_session_id else None
+
     # Select Application
-    application_name = st.selectbox("Select an Application", get_applications())
+    applications = get_applications()
+    application_name = st.selectbox("Select an Application", applications,
+                                    index=applications.index(linked_application) if linked_application in applications else 0)
     if not application_name:
         st.stop()
     st.subheader(f"Feedback for Test Plan of Application:  {application_name}!")
     # Select Document Session
     sessions = get_sessions_for_app(application_name)
+    session_ids = [session[0] for session in sessions]
     session_choice = st.selectbox("Select a Document Session", sessions,
+                                  index=session_ids.index(linked_session_id) if linked_session_id in session_ids else 0,
                                   format_func=lambda x: f"{x[1]} - {os.path.basename(x[3])}")
     if not session_choice:
         st.stop()
 
     session_id, doc_gen_id, model_used, filename = session_choice
-    data = load_test_plan_data(filename)
-    section_details = data['section_details']
+    section_details = load_section_details(session_id, doc_gen_id, application_name, model_used, filename)
     st.subheader(f"Document Session Details as mentioned below.")
     st.info(f"Session ID: {session_id}")
     st.info(f"Document Generation ID: {doc_gen_id}")
@@ -101,7 +96,7 @@ def feedback_app():
                 "Section": detail['Section'],
                 "Content": detail['Content'],
                 "Word Count": detail['Word Count'],
-                "Generation Time": detail['Generation Time'],
+                "Generation Time": detail.get('Generation Time'),
                 "Detail Rating": detail_rating,
                 "Clarity Rating": clarity_rating,
                 "Relevance Rating": relevance_rating
@@ -123,7 +118,7 @@ def feedback_app():
         })
 
         if st.form_submit_button("Submit All Feedback"):
-            save_feedback(feedback_data, application_name, model_used)
+            save_feedback(feedback_data, doc_gen_id, model_used)
 
 
 if __name__ == "__main__":
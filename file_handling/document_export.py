@@ -0,0 +1,99 @@
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from docx import Document
+
+from storage.cache_store import make_cache_key
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+TEST_PLAN_DIRECTORY = "output/test-plan"
+# Rendered documents of the most recent plans, kept in memory by plan hash
+MAX_RENDERED_PLANS = 32
+
+# One rendered plan version: its hash, version number (time of first render), DOCX bytes and saved path
+ExportedPlan = namedtuple('ExportedPlan', ['plan_hash', 'version', 'data', 'path', 'saved'])
+
+_exports = OrderedDict()
+_exports_lock = threading.Lock()
+# A single writer thread saves documents to disk in the background, in submission order
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="docx-writer")
+
+
+def build_test_plan_document(full_test_plan):
+    """Build the Word document of a test plan, turning Markdown headings and bold text into Word styles."""
+    doc = Document()
+    for section, content in full_test_plan.items():
+        # Add main section heading from the dictionary key
+        doc.add_heading(section, level=1)
+
+        # Split content by lines for fine-grained processing
+        lines = content.split('\n')
+        for line in lines:
+            # Skip empty lines
+            if not line.strip():
+                continue
+            # Handling Markdown-style headings within the section content
+            if line.startswith('## '):
+                doc.add_heading(line.replace('## ', ''), level=2)
+            elif line.startswith('### '):
+                doc.add_heading(line.replace('### ', ''), level=3)
+            elif line.startswith('#### '):
+                doc.add_heading(line.replace('#### ', ''), level=4)
+            else:
+                # Process the paragraph and handle bold formatting
+                p = doc.add_paragraph()
+                for part in re.split(r'(\*\*[^*]+\*\*)', line):  # Split and keep the bold parts
+                    if part.startswith('**') and part.endswith('**'):
+                        part = part[2:-2]  # Remove the asterisks
+                        p.add_run(part).bold = True
+                    else:
+                        p.add_run(part)
+    return doc
+
+
+def test_plan_path(application_name, model_used):
+    application_directory = os.path.join(TEST_PLAN_DIRECTORY, application_name.replace(" ", "_"))
+    return os.path.join(application_directory, f"{application_name.replace(' ', '_')}_Test_Plan_{model_used}.docx")
+
+
+def hash_plan(full_test_plan, application_name, model_used):
+    return make_cache_key(application_name, model_used, list(full_test_plan.items()))
+
+
+def _write(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name first so a partially written document is never left at path
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(data)
+    os.replace(temporary_path, path)
+    print(f"Document saved to {path}")
+    return path
+
+
+def export_test_plan(full_test_plan, application_name, model_used):
+    """Return the exported version of a plan, rendering it and queueing its save only the first time.
+
+    The result's data is the DOCX as bytes, ready for st.download_button, and saved is a
+    future that completes once the document has been written to its path.
+    """
+    plan_hash = hash_plan(full_test_plan, application_name, model_used)
+    with _exports_lock:
+        if plan_hash in _exports:
+            _exports.move_to_end(plan_hash)
+            return _exports[plan_hash]
+        buffer = BytesIO()
+        build_test_plan_document(full_test_plan).save(buffer)
+        data = buffer.getvalue()
+        path = test_plan_path(application_name, model_used)
+        exported = ExportedPlan(plan_hash, datetime.now().strftime("%Y%m%d%H%M%S"), data, path,
+                                _writer.submit(_write, data, path))
+        _exports[plan_hash] = exported
+        while len(_exports) > MAX_RENDERED_PLANS:
+            _exports.popitem(last=False)
+        return exported
@@ -1,11 +1,9 @@
 from textblob import TextBlob
 
-import nltk
+from nlp_pre_processing.resources import ensure_nltk
 
-# Download necessary NLTK corpora
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('brown')
 
 def assess_sentiment(user_stories):
+    # NLTK corpora used by TextBlob are fetched on first use instead of at import
+    ensure_nltk('punkt', 'averaged_perceptron_tagger', 'brown')
     return TextBlob(user_stories).sentiment
@@ -1,18 +1,124 @@
 # Example: keyword_extraction.py
+import hashlib
+import math
+import threading
 from collections import Counter
-import nltk
-from nltk.corpus import stopwords
+from concurrent.futures import ProcessPoolExecutor
 from nltk.tokenize import word_tokenize
 
-nltk.download('punkt')
-nltk.download('stopwords')
+from nlp_pre_processing.resources import ensure_nltk, english_stopwords
 
-def extract_keywords(text, top_n=10):
-    stop_words = set(stopwords.words('english'))
-    words = word_tokenize(text.lower())
-    keywords = [word for word in words if word not in stop_words and word.isalnum()]
-    frequent_keywords = Counter(keywords).most_common(top_n)
-    return [word for word, freq in frequent_keywords]
+# Documents of at least this many characters in total are tokenized in a process pool
+PARALLEL_TOKENIZE_CHARS = 200000
+# Term counts of recently tokenized documents, shared by every index of the process
+MAX_CACHED_DOCUMENTS = 1000
+_term_counts = {}
+_term_counts_lock = threading.Lock()
+
+
+def tokenize_document(text, ngram_range=(1, 1)):
+    """Count the terms of a document: lower-cased alphanumeric words that are not stopwords, and their n-grams."""
+    ensure_nltk('punkt')
+    stop_words = english_stopwords()
+    words = [word for word in word_tokenize(text.lower()) if word not in stop_words and word.isalnum()]
+    terms = Counter()
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        terms.update(' '.join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return terms
+
+
+def _tokenize(args):
+    return tokenize_document(*args)
+
+
+class KeywordIndex:
+    """Sparse term counts of a set of documents, scored with TF-IDF.
+
+    Documents can be added (or replaced, by name) one at a time; only the new document is
+    tokenized and the document frequencies are updated incrementally. Term counts are
+    cached process-wide by document content, so the same text is not tokenized twice.
+    """
+
+    def __init__(self, ngram_range=(1, 1)):
+        self.ngram_range = ngram_range
+        self._documents = {}
+        self._document_frequency = Counter()
+        self._term_counts = {}
+        self._lock = threading.Lock()
+
+    def _key(self, text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest(), self.ngram_range
+
+    def add_document(self, name, text):
+        self.add_documents({name: text})
+
+    def add_documents(self, documents, max_workers=None):
+        """Add or replace documents given as {name: text}, tokenizing new texts in parallel when they are large."""
+        with _term_counts_lock:
+            missing = {}
+            for text in documents.values():
+                key = self._key(text)
+                if key in _term_counts:
+                    self._term_counts[key] = _term_counts[key]
+                else:
+                    missing[key] = text
+        if missing:
+            keys, texts = list(missing), list(missing.values())
+            if len(texts) > 1 and sum(len(text) for text in texts) >= PARALLEL_TOKENIZE_CHARS:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    counts = list(executor.map(_tokenize, [(text, self.ngram_range) for text in texts]))
+            else:
+                counts = [tokenize_document(text, self.ngram_range) for text in texts]
+            with _term_counts_lock:
+                _term_counts.update(zip(keys, counts))
+                while len(_term_counts) > MAX_CACHED_DOCUMENTS:
+                    del _term_counts[next(iter(_term_counts))]
+            self._term_counts.update(zip(keys, counts))
+        with self._lock:
+            for name, text in documents.items():
+                self._remove(name)
+                key = self._key(text)
+                self._documents[name] = key
+                self._document_frequency.update(self._term_counts[key].keys())
+
+    def remove_document(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name):
+        key = self._documents.pop(name, None)
+        if key is not None:
+            self._document_frequency.subtract(self._term_counts[key].keys())
+            self._document_frequency += Counter()  # Drop terms no document contains any more
+
+    def keywords(self, top_n=10):
+        """Return the top_n terms by TF-IDF summed over all documents."""
+        with self._lock:
+            term_counts = [self._term_counts[key] for key in self._documents.values()]
+            document_frequency = dict(self._document_frequency)
+        document_count = len(term_counts)
+        # Smoothed IDF, as in scikit-learn, so terms found in every document still score
+        idf = {term: math.log((1 + document_count) / (1 + frequency)) + 1
+               for term, frequency in document_frequency.items()}
+        scores = Counter()
+        for counts in term_counts:
+            length = sum(counts.values()) or 1
+            for term, count in counts.items():
+                scores[term] += count / length * idf[term]
+        return [term for term, score in scores.most_common(top_n)]
+
+
+def extract_keywords(text, top_n=10, documents=None):
+    """Return the top_n keywords of text, scored by TF-IDF across documents when they are given.
+
+    documents are the per-file texts text was concatenated from.
+    """
+    index = KeywordIndex()
+    if documents:
+        index.add_documents({f"document {i}": document for i, document in enumerate(documents)})
+    else:
+        index.add_document("text", text)
+    return index.keywords(top_n)
 
 # In your main app.py
 
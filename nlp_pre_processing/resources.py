@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import nltk
+
+# Corpora and models are kept here so the app can run offline once they have been fetched
+NLP_DATA_DIR = os.environ.get('NLP_DATA_DIR',
+                              os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'nlp_data'))
+# With NLP_OFFLINE=1 missing resources raise instead of being downloaded
+OFFLINE = os.environ.get('NLP_OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+# NLTK package name -> path looked up by nltk.data.find
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'brown': 'corpora/brown',
+}
+
+if NLP_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLP_DATA_DIR)
+
+_resources = {}
+_load_times = {}
+_lock = threading.Lock()
+_resource_locks = {}
+
+
+def get_resource(name, loader):
+    """Return the resource called name, loading it with loader on first use only.
+
+    Resources are shared by the whole process (every Streamlit session and rerun), and
+    the time each one took to load is recorded.
+    """
+    if name in _resources:
+        return _resources[name]
+    with _lock:
+        resource_lock = _resource_locks.setdefault(name, threading.Lock())
+    # Concurrent first uses of one resource wait for a single load
+    with resource_lock:
+        if name not in _resources:
+            start_time = time.time()
+            _resources[name] = loader()
+            _load_times[name] = time.time() - start_time
+    return _resources[name]
+
+
+def resource_load_times():
+    """Return the seconds spent loading each resource loaded so far."""
+    return dict(_load_times)
+
+
+def _find_or_download(package):
+    try:
+        nltk.data.find(NLTK_RESOURCES[package])
+    except LookupError:
+        if OFFLINE:
+            raise LookupError(f"NLTK resource '{package}' is not in {NLP_DATA_DIR} and NLP_OFFLINE is set.")
+        os.makedirs(NLP_DATA_DIR, exist_ok=True)
+        if not nltk.download(package, download_dir=NLP_DATA_DIR, quiet=True):
+            raise LookupError(f"NLTK resource '{package}' could not be downloaded to {NLP_DATA_DIR}.")
+    return True
+
+
+def ensure_nltk(*packages):
+    """Make sure the NLTK packages are available, downloading missing ones to NLP_DATA_DIR."""
+    for package in packages:
+        get_resource(f'nltk:{package}', lambda: _find_or_download(package))
+
+
+def english_stopwords():
+    def load():
+        ensure_nltk('stopwords')
+        from nltk.corpus import stopwords
+        return frozenset(stopwords.words('english'))
+
+    return get_resource('stopwords:english', load)
+
+
+def summarization_pipeline(model_name='t5-small'):
+    """Return the transformers summarization pipeline of model_name.
+
+    The model is loaded from NLP_DATA_DIR when it has been saved there; otherwise it is
+    downloaded once and saved there for offline use.
+    """
+    def load():
+        from transformers import pipeline
+        local_dir = os.path.join(NLP_DATA_DIR, model_name)
+        if os.path.isdir(local_dir):
+            return pipeline("summarization", model=local_dir, tokenizer=local_dir)
+        if OFFLINE:
+            raise LookupError(f"Model '{model_name}' is not in {NLP_DATA_DIR} and NLP_OFFLINE is set.")
+        summarizer = pipeline("summarization", model=model_name)
+        summarizer.save_pretrained(local_dir)
+        return summarizer
+
+    return get_resource(f'transformers:{model_name}', load)
+
+
+def summarization_tokenizer(model_name='t5-small'):
+    """Return the tokenizer of model_name without loading the model itself."""
+    def load():
+        from transformers import AutoTokenizer
+        local_dir = os.path.join(NLP_DATA_DIR, model_name)
+        if os.path.isdir(local_dir):
+            return AutoTokenizer.from_pretrained(local_dir)
+        if OFFLINE:
+            raise LookupError(f"Model '{model_name}' is not in {NLP_DATA_DIR} and NLP_OFFLINE is set.")
+        return AutoTokenizer.from_pretrained(model_name)
+
+    return get_resource(f'tokenizer:{model_name}', load)
@@ -1,14 +1,111 @@
 # Example: summarizer.py
-from transformers import pipeline
+import hashlib
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from nltk.tokenize import sent_tokenize
+
+from nlp_pre_processing.resources import ensure_nltk, summarization_pipeline, summarization_tokenizer
+from storage.cache_store import CacheStore, make_cache_key
+
+SUMMARY_MODEL = 't5-small'
+# t5-small reads at most 512 tokens; the rest is left for the "summarize:" prefix
+MAX_CHUNK_TOKENS = 480
+MIN_CHUNK_TOKENS = 160
+BATCH_SIZE = 8
+SUMMARY_MAX_LENGTH = 100
+SUMMARY_MIN_LENGTH = 30
+# Summaries of every chunk are kept on disk, keyed by the chunk text
+summary_cache = CacheStore('summary_cache.db', 'chunk_summaries', max_entries=50000)
 
-summarizer = pipeline("summarization", model="t5-small")
 
 def summarize_text(user_stories):
-    return summarizer(user_stories, max_length=100, min_length=30, do_sample=False)[0]['summary_text']
+    return summarization_pipeline(SUMMARY_MODEL)(user_stories, max_length=SUMMARY_MAX_LENGTH,
+                                                 min_length=SUMMARY_MIN_LENGTH, do_sample=False)[0]['summary_text']
+
+
+def _is_boundary(sentence):
+    # About one sentence in four ends a chunk, decided by its content rather than its position,
+    # so an edit only changes the chunks around it and the others keep their cached summaries
+    return hashlib.md5(sentence.encode('utf-8')).digest()[0] % 4 == 0
+
+
+def split_into_chunks(text, model_name=SUMMARY_MODEL, max_tokens=MAX_CHUNK_TOKENS, min_tokens=MIN_CHUNK_TOKENS):
+    """Split text into chunks of whole sentences that fit the model's input, counted in model tokens."""
+    ensure_nltk('punkt')
+    tokenizer = summarization_tokenizer(model_name)
+    chunks = []
+    current, current_tokens = [], 0
+    for sentence in sent_tokenize(text):
+        words = sentence.split()
+        tokens = len(tokenizer.encode(sentence, add_special_tokens=False))
+        if tokens > max_tokens:
+            # A sentence too long for the model is cut into pieces of whole words
+            step = max(1, len(words) * max_tokens // tokens)
+            pieces = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            piece_tokens = tokens if len(pieces) == 1 else len(tokenizer.encode(piece, add_special_tokens=False))
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+            if current_tokens >= min_tokens and _is_boundary(piece):
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def summarize_chunks(chunks, model_name=SUMMARY_MODEL, batch_size=BATCH_SIZE):
+    """Summarize chunks with the pipeline, batch_size chunks per forward pass."""
+    summarizer = summarization_pipeline(model_name)
+    results = summarizer(list(chunks), batch_size=batch_size, max_length=SUMMARY_MAX_LENGTH,
+                         min_length=SUMMARY_MIN_LENGTH, do_sample=False, truncation=True)
+    return [result['summary_text'] for result in results]
+
+
+def _summarize_slice(args):
+    chunks, model_name, batch_size = args
+    return summarize_chunks(chunks, model_name, batch_size)
+
 
+def preprocess_user_stories(user_stories, batch_size=BATCH_SIZE, processes=None, model_name=SUMMARY_MODEL,
+                            use_cache=True):
+    """Summarize long user stories chunk by chunk and join the chunk summaries.
 
-def preprocess_user_stories(user_stories):
-    # Split long user stories into chunks if they exceed the token limit of the model
-    chunks = (user_stories[i:i + 1024] for i in range(0, len(user_stories), 1024))
-    summarized_text = ' '.join(summarizer(chunk)[0]['summary_text'] for chunk in chunks if chunk.strip())
-    return summarized_text
\ No newline at end of file
+    Chunks already summarized before are taken from the cache. The others are summarized
+    in batches, split over processes worker processes (each loading its own model) when
+    processes is greater than one.
+    """
+    if not re.search(r'\S', user_stories):
+        return ''
+    chunks = split_into_chunks(user_stories, model_name)
+    keys = [make_cache_key(model_name, SUMMARY_MAX_LENGTH, SUMMARY_MIN_LENGTH, chunk) for chunk in chunks]
+    summaries = {}
+    if use_cache:
+        for key in set(keys):
+            cached = summary_cache.get(key)
+            if cached is not None:
+                summaries[key] = cached['summary']
+    pending = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in summaries:
+            pending.setdefault(key, chunk)
+    if pending:
+        pending_keys, pending_chunks = list(pending), list(pending.values())
+        if processes and processes > 1 and len(pending_chunks) > batch_size:
+            size = -(-len(pending_chunks) // processes)
+            slices = [(pending_chunks[i:i + size], model_name, batch_size)
+                      for i in range(0, len(pending_chunks), size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                new_summaries = [summary for part in executor.map(_summarize_slice, slices) for summary in part]
+        else:
+            new_summaries = summarize_chunks(pending_chunks, model_name, batch_size)
+        for key, summary in zip(pending_keys, new_summaries):
+            summaries[key] = summary
+            summary_cache.set(key, {'summary': summary})
+    return ' '.join(summaries[key] for key in keys)
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+
+import openai
+
+# Backend of all ChatCompletion and model listing requests: 'openai', or 'mock' to run without the API
+BACKEND_ENV = 'OPENAI_BACKEND'
+# API key used with backends that do not need one
+MOCK_API_KEY = 'mock'
+
+# Models the mock backend lists besides those it has latency data for
+MOCK_MODELS = ['gpt-3.5-turbo', 'gpt-3.5-turbo-1106', 'gpt-3.5-turbo-16k', 'gpt-4', 'gpt-4-turbo',
+               'gpt-4-1106-preview']
+# Latency of one request of a model without history: log-normal around 8 seconds, at 30 tokens per second
+DEFAULT_LATENCY_MEDIAN = 8.0
+DEFAULT_TOKEN_RATE_MEDIAN = 30.0
+DEFAULT_SIGMA = 0.5
+# Share of a request's latency spent before its first token
+TIME_TO_FIRST_TOKEN_SHARE = 0.15
+# Completion tokens per word of the stored sections
+TOKENS_PER_WORD = 1.3
+# Timed sections a model needs before its own profile is fitted; models with fewer use the pooled one
+MIN_PROFILE_SAMPLES = 10
+# Streamed tokens are slept for in batches of at least this many seconds
+MIN_STREAM_SLEEP = 0.005
+
+CRITICALITIES = ['High', 'Medium', 'Low']
+MOCK_VOCABULARY = ('test verify validate user login account data report system requirement scenario coverage '
+                   'risk defect environment release security performance interface workflow access').split()
+
+# Log-normal parameters (of the natural log) of a model's request latency in seconds and token rate
+LatencyProfile = namedtuple('LatencyProfile', ['latency_mu', 'latency_sigma', 'rate_mu', 'rate_sigma', 'samples'])
+DEFAULT_PROFILE = LatencyProfile(math.log(DEFAULT_LATENCY_MEDIAN), DEFAULT_SIGMA, math.log(DEFAULT_TOKEN_RATE_MEDIAN),
+                                 DEFAULT_SIGMA, 0)
+
+
+class OpenAIBackend:
+    """Sends requests to the OpenAI API (or to any server at openai.api_base, e.g. python -m open_ai.mock_server)."""
+    name = 'openai'
+    requires_api_key = True
+
+    def chat_completion(self, api_key=None, **kwargs):
+        return openai.ChatCompletion.create(api_key=api_key, **kwargs)
+
+    def list_models(self, api_key=None):
+        response = openai.Engine.list(api_key=api_key)
+        return [engine['id'] for engine in response['data']]
+
+
+def _log_normal_fit(values, min_samples=MIN_PROFILE_SAMPLES):
+    logs = [math.log(value) for value in values if value and value > 0 and math.isfinite(value)]
+    if len(logs) < max(2, min_samples):
+        return None
+    mu = sum(logs) / len(logs)
+    sigma = math.sqrt(sum((value - mu) ** 2 for value in logs) / (len(logs) - 1))
+    if sigma == 0:  # Identical values say nothing about the spread
+        return None
+    return mu, sigma, len(logs)
+
+
+def fit_latency_profiles(data=None, min_samples=MIN_PROFILE_SAMPLES):
+    """Fit a LatencyProfile per model (and a pooled one under None) to the stored section generation times.
+
+    The token rate of a section is its word count (in tokens) over its generation time.
+    data defaults to the feedback dataset as it is, or to the feedback CSVs when the dataset
+    has not been built yet; nothing is written, so callers wanting the latest feedback pass
+    load_feedback_data(). Models with fewer than min_samples timed sections are left out, so
+    they use the pooled profile (or DEFAULT_PROFILE).
+    """
+    if data is None:
+        try:
+            from reporting.feedback_dataset import load_feedback_data, read_feedback_files
+            data = load_feedback_data(ingest=False)
+            if data.empty:
+                data = read_feedback_files()
+        except Exception as e:
+            print(f"Latency profiles are not available: {str(e)}")
+            return {}
+    if data.empty:
+        return {}
+    import pandas as pd
+    sections = data[data['Section'] != 'Overall Feedback']
+    times = pd.to_numeric(sections['Generation Time'], errors='coerce')
+    rates = pd.to_numeric(sections['Word Count'], errors='coerce') * TOKENS_PER_WORD / times
+    profiles = {}
+    groups = [(None, sections.index)] + list(sections.groupby('Model Name').groups.items())
+    for model, index in groups:
+        latency = _log_normal_fit(times[index].tolist(), min_samples)
+        if latency is None:
+            continue
+        rate = _log_normal_fit(rates[index].tolist(), min_samples) or \
+            (DEFAULT_PROFILE.rate_mu, DEFAULT_PROFILE.rate_sigma, 0)
+        profiles[model] = LatencyProfile(latency[0], latency[1], rate[0], rate[1], latency[2])
+    return profiles
+
+
+class MockBackend:
+    """In-process stand-in for the ChatCompletion API.
+
+    Every request takes a latency drawn from the log-normal profile of its model (see
+    fit_latency_profiles), scaled by latency_scale, and completes at a token rate drawn
+    the same way; streamed requests deliver their tokens at that rate after the first
+    token. Requests beyond requests_per_minute, and a rate_limit_probability share of all
+    requests, fail with a RateLimitError carrying retry_after. Replies are made of
+    "Item: Criticality - text" lines and are the same for the same messages.
+    """
+    name = 'mock'
+    requires_api_key = False
+
+    def __init__(self, profiles=None, latency_scale=1.0, requests_per_minute=None, rate_limit_probability=0.0,
+                 retry_after=1.0, seed=None, models=None):
+        self.profiles = fit_latency_profiles() if profiles is None else profiles
+        self.latency_scale = latency_scale
+        self.requests_per_minute = requests_per_minute
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.models = sorted(set(models or MOCK_MODELS) | {model for model in self.profiles if model})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_times = []
+        self.requests = 0
+        self.rate_limited = 0
+
+    def list_models(self, api_key=None):
+        return list(self.models)
+
+    def profile(self, model):
+        return self.profiles.get(model) or self.profiles.get(None) or DEFAULT_PROFILE
+
+    def _admit(self):
+        """Count a request and return the retry-after of the 429 it gets, or None."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.requests_per_minute:
+                self._request_times = [t for t in self._request_times if now - t < 60]
+                if len(self._request_times) >= self.requests_per_minute:
+                    self.rate_limited += 1
+                    return max(0.0, 60 - (now - self._request_times[0]))
+                self._request_times.append(now)
+            if self._random.random() < self.rate_limit_probability:
+                self.rate_limited += 1
+                return self.retry_after
+        return None
+
+    def _draw(self, model):
+        profile = self.profile(model)
+        with self._lock:
+            latency = self._random.lognormvariate(profile.latency_mu, profile.latency_sigma)
+            rate = self._random.lognormvariate(profile.rate_mu, profile.rate_sigma)
+        return latency * self.latency_scale, rate / self.latency_scale
+
+    def _reply(self, messages, completion_tokens):
+        words = []
+        content_rng = random.Random(hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest())
+        lines = []
+        while len(words) < completion_tokens:
+            line = [f"Item {len(lines) + 1}: {content_rng.choice(CRITICALITIES)} -"] + \
+                   content_rng.choices(MOCK_VOCABULARY, k=content_rng.randint(6, 14))
+            lines.append(line)
+            words.extend(line)
+        return "\n".join(" ".join(line) for line in lines)
+
+    def chat_completion(self, api_key=None, model=None, messages=None, max_tokens=None, stream=False, **kwargs):
+        retry_after = self._admit()
+        if retry_after is not None:
+            raise openai.error.RateLimitError("Rate limit reached for requests (mock backend)", http_status=429,
+                                              headers={'retry-after': f"{retry_after:.3f}"})
+        latency, rate = self._draw(model)
+        time_to_first_token = latency * TIME_TO_FIRST_TOKEN_SHARE
+        completion_tokens = max(1, int(rate * (latency - time_to_first_token)))
+        finish_reason = 'stop'
+        if max_tokens and completion_tokens > max_tokens:
+            completion_tokens, finish_reason = max_tokens, 'length'
+        # One token per word of the reply, with the whitespace that follows it
+        tokens = re.findall(r'\S+\s*', self._reply(messages or [], completion_tokens))[:completion_tokens]
+        if stream:
+            return self._stream(model, tokens, time_to_first_token, rate, finish_reason)
+        time.sleep(time_to_first_token + len(tokens) / rate)
+        prompt_tokens = sum(len(str(message.get('content', '')).split()) for message in messages or [])
+        return openai.util.convert_to_openai_object({
+            'id': f"chatcmpl-mock-{self.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens).rstrip()},
+                         'finish_reason': finish_reason}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                      'total_tokens': prompt_tokens + len(tokens)}
+        })
+
+    def _stream(self, model, tokens, time_to_first_token, rate, finish_reason):
+        time.sleep(time_to_first_token)
+        owed = 0.0
+        for index, token in enumerate(tokens):
+            owed += 1 / rate
+            if owed >= MIN_STREAM_SLEEP:
+                time.sleep(owed)
+                owed = 0.0
+            yield _chunk(model, {'content': token.rstrip() if index == len(tokens) - 1 else token}, None)
+        yield _chunk(model, {}, finish_reason)
+
+
+def _chunk(model, delta, finish_reason):
+    return openai.util.convert_to_openai_object({
+        'object': 'chat.completion.chunk', 'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+    })
+
+
+def mock_backend_from_env():
+    """Build a MockBackend configured by the MOCK_* environment variables."""
+    requests_per_minute = os.environ.get('MOCK_REQUESTS_PER_MINUTE')
+    seed = os.environ.get('MOCK_SEED')
+    return MockBackend(latency_scale=float(os.environ.get('MOCK_LATENCY_SCALE', 1.0)),
+                       requests_per_minute=int(requests_per_minute) if requests_per_minute else None,
+                       rate_limit_probability=float(os.environ.get('MOCK_RATE_LIMIT_PROBABILITY', 0.0)),
+                       retry_after=float(os.environ.get('MOCK_RETRY_AFTER', 1.0)),
+                       seed=int(seed) if seed else None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the backend of this process, chosen by OPENAI_BACKEND on first use unless set_backend was called."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get(BACKEND_ENV, 'openai')
+            if name not in ('openai', 'mock'):
+                raise ValueError(f"Unknown {BACKEND_ENV} '{name}', expected 'openai' or 'mock'.")
+            _backend = mock_backend_from_env() if name == 'mock' else OpenAIBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """Use a backend instance, or 'openai' / 'mock' (configured from the environment), for all requests."""
+    global _backend
+    if backend == 'openai':
+        backend = OpenAIBackend()
+    elif backend == 'mock':
+        backend = mock_backend_from_env()
+    with _backend_lock:
+        _backend = backend
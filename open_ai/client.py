@@ -0,0 +1,370 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+import openai
+import requests
+
+from open_ai.backends import get_backend
+from open_ai.progress import report, REQUEST_SENT, FIRST_TOKEN, TOKENS, RESPONSE_RECEIVED
+from open_ai.prompt_builder import count_message_tokens
+from storage.cache_store import CacheStore, make_cache_key
+
+# Responses are cached on disk next to session_data.db, keyed by the request that produced them
+RESPONSE_CACHE_DB = 'response_cache.db'
+RESPONSE_CACHE_TTL = 30 * 24 * 60 * 60  # 30 days
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+response_cache = CacheStore(RESPONSE_CACHE_DB, 'responses', ttl_seconds=RESPONSE_CACHE_TTL,
+                            max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+# Set per context (e.g. one generation run of one Streamlit session) and inherited by the workers it starts
+_bypass_response_cache = contextvars.ContextVar('bypass_response_cache', default=False)
+
+# Completions are streamed so sections can be rendered while they are generated
+# Set per context, like the response cache bypass
+_stream_responses = contextvars.ContextVar('stream_responses', default=True)
+STREAM_REPORT_INTERVAL = 0.1  # Seconds between two reports of streamed tokens
+
+# Upper bound on requests in flight across all clients and plans; None leaves it to the rate limiters
+_request_slots = None
+
+# Requests and tokens per minute allowed for each model by the account's tier; models not listed use the defaults.
+# Both are read from the environment on import: OPENAI_RPM and OPENAI_TPM set the defaults, and
+# OPENAI_RATE_LIMITS_FILE names a JSON file of per-model limits (see load_rate_limits)
+RPM_ENV = 'OPENAI_RPM'
+TPM_ENV = 'OPENAI_TPM'
+RATE_LIMITS_FILE_ENV = 'OPENAI_RATE_LIMITS_FILE'
+DEFAULT_RATE_LIMITS = {'requests_per_minute': 500, 'tokens_per_minute': 60000}
+MODEL_RATE_LIMITS = {}
+
+MAX_RETRIES = 6
+BASE_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# Errors worth retrying; anything else (invalid request, authentication, ...) fails immediately
+RETRYABLE_ERRORS = (openai.error.RateLimitError, openai.error.APIError, openai.error.Timeout,
+                    openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+# One pooled HTTP session is shared by all threads, so connections to the API are reused
+HTTP_POOL_SIZE = 32
+_http_session = requests.Session()
+_http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                                              pool_maxsize=HTTP_POOL_SIZE, max_retries=2))
+openai.requestssession = _http_session
+
+
+class TokenBucket:
+    """A token bucket refilled continuously up to its capacity.
+
+    Callers reserve what they need up front; when the bucket runs short the reservation
+    goes into debt and the caller is told how long to wait, so waiting callers are served
+    in arrival order instead of retrying all at once.
+    """
+
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take amount from the bucket and return the number of seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+            self._updated_at = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.refill_per_second)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets of one model."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Wait until a request of the given size may be sent and return the time waited."""
+        wait_time = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self._lock:
+            wait_time = max(wait_time, self._blocked_until - time.monotonic())
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return max(0.0, wait_time)
+
+    def pause(self, seconds):
+        """Hold back every request of this model, e.g. for the retry-after period of a 429."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def _retry_after(error):
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None and getattr(error, 'headers', None):
+        retry_after = error.headers.get('retry-after')
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenAIClient:
+    """Shared entry point for ChatCompletion requests made with one API key.
+
+    Requests wait for the rate limiter of their model, are retried with jittered
+    exponential backoff (at least the retry-after period of a 429), and are counted in
+    the client's metrics.
+    """
+
+    def __init__(self, api_key, max_retries=MAX_RETRIES, base_delay=BASE_RETRY_DELAY, max_delay=MAX_RETRY_DELAY):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._metrics = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0,
+                         'queue_wait': 0.0, 'max_queue_wait': 0.0}
+
+    def limiter(self, model):
+        with self._lock:
+            if model not in self._limiters:
+                limits = dict(DEFAULT_RATE_LIMITS, **MODEL_RATE_LIMITS.get(model, {}))
+                self._limiters[model] = RateLimiter(limits['requests_per_minute'], limits['tokens_per_minute'])
+            return self._limiters[model]
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._metrics[name] += value
+
+    def metrics(self):
+        """Return request, retry and 429 counters with the total, average and maximum queue wait."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['average_queue_wait'] = metrics['queue_wait'] / metrics['requests'] if metrics['requests'] else 0.0
+        return metrics
+
+    def _backoff(self, attempt, base_delay):
+        # Full jitter keeps retries of concurrent requests from firing together
+        return random.uniform(0, min(self.max_delay, base_delay * (2 ** attempt)))
+
+    def create(self, max_retries=None, base_delay=None, **kwargs):
+        """Send a ChatCompletion request, waiting for the rate limiter and retrying transient errors."""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        base_delay = self.base_delay if base_delay is None else base_delay
+        limiter = self.limiter(kwargs.get('model'))
+        # A request counts its prompt and its whole completion budget against the tokens-per-minute limit
+        request_tokens = (count_message_tokens(kwargs.get('messages'), kwargs.get('model'))
+                          + (kwargs.get('max_tokens') or 0))
+        attempt = 0
+        while True:
+            queue_wait = limiter.acquire(request_tokens)
+            self._count(requests=1, queue_wait=queue_wait)
+            with self._lock:
+                self._metrics['max_queue_wait'] = max(self._metrics['max_queue_wait'], queue_wait)
+            try:
+                return self._send(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                delay = self._backoff(attempt, base_delay)
+                if isinstance(e, openai.error.RateLimitError):
+                    self._count(rate_limited=1)
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        delay = retry_after + random.uniform(0, base_delay)
+                    # Every request of this model waits, not only the one that hit the limit
+                    limiter.pause(delay)
+                if attempt >= max_retries:
+                    self._count(failures=1)
+                    print(f"Maximum retry attempts reached: {str(e)}")
+                    raise
+                attempt += 1
+                self._count(retries=1)
+                print(f"{type(e).__name__}: {str(e)}. Retrying in {delay:.2f} seconds...")
+                if not isinstance(e, openai.error.RateLimitError):
+                    time.sleep(delay)
+            except openai.error.OpenAIError:
+                self._count(failures=1)
+                raise
+
+    def _send(self, **kwargs):
+        """Send one attempt, holding a request slot until its response (or its whole stream) has arrived."""
+        slots = _request_slots
+        if slots is None:
+            return get_backend().chat_completion(api_key=self.api_key, **kwargs)
+        slots.acquire()
+        try:
+            response = get_backend().chat_completion(api_key=self.api_key, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        if kwargs.get('stream'):
+            return _release_when_done(response, slots)
+        slots.release()
+        return response
+
+    def _stream(self, **kwargs):
+        """Stream a ChatCompletion, reporting its tokens as they arrive, and return it as a complete response."""
+        parts = []
+        pending = []
+        chunk_count = pending_count = 0
+        finish_reason = None
+        last_report = time.time()
+        for chunk in self.create(stream=True, **kwargs):
+            choice = chunk['choices'][0] if chunk['choices'] else {}
+            finish_reason = choice.get('finish_reason') or finish_reason
+            delta = choice.get('delta', {}).get('content')
+            if not delta:
+                continue
+            if not parts:
+                report(FIRST_TOKEN)
+            parts.append(delta)
+            pending.append(delta)
+            chunk_count += 1
+            pending_count += 1
+            # Tokens are reported in small batches to keep the event rate bounded
+            if time.time() - last_report >= STREAM_REPORT_INTERVAL:
+                report(TOKENS, text=''.join(pending), count=pending_count)
+                pending, pending_count, last_report = [], 0, time.time()
+        if pending:
+            report(TOKENS, text=''.join(pending), count=pending_count)
+        # Every streamed content chunk carries one token
+        return _completion_response(kwargs.get('model'), ''.join(parts), finish_reason, chunk_count)
+
+    def chat_completion(self, max_retries=None, base_delay=None, **kwargs):
+        """Create a ChatCompletion, served from the response cache when the same request was made before.
+
+        Requests, streamed tokens and responses are reported to the progress of the section being generated.
+        """
+        cache_key = make_cache_key(kwargs.get('model'), kwargs.get('messages'), kwargs.get('temperature'),
+                                   kwargs.get('max_tokens'))
+        prompt_tokens = count_message_tokens(kwargs.get('messages'), kwargs.get('model'))
+        if not _bypass_response_cache.get():
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                completion_tokens = cached.get('usage', {}).get('completion_tokens')
+                report(REQUEST_SENT, model=kwargs.get('model'), prompt_tokens=prompt_tokens, cached=True)
+                report(FIRST_TOKEN, cached=True)
+                report(TOKENS, text=cached['choices'][0]['message']['content'], count=completion_tokens or 0,
+                       cached=True)
+                report(RESPONSE_RECEIVED, completion_tokens=completion_tokens, cached=True)
+                return openai.util.convert_to_openai_object(cached)
+        report(REQUEST_SENT, model=kwargs.get('model'), prompt_tokens=prompt_tokens)
+        if _stream_responses.get():
+            response = self._stream(max_retries=max_retries, base_delay=base_delay, **kwargs)
+        else:
+            response = self.create(max_retries=max_retries, base_delay=base_delay, **kwargs)
+            report(FIRST_TOKEN, streamed=False)
+            report(TOKENS, text=response.choices[0].message['content'],
+                   count=response.get('usage', {}).get('completion_tokens') or 0, streamed=False)
+        report(RESPONSE_RECEIVED, completion_tokens=response.get('usage', {}).get('completion_tokens'))
+        response_cache.set(cache_key, response.to_dict_recursive())
+        return response
+
+
+def _release_when_done(stream, slots):
+    try:
+        yield from stream
+    finally:
+        slots.release()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Return the client of an API key; every caller using the same key shares its rate limits."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = OpenAIClient(api_key)
+        return _clients[api_key]
+
+
+def chat_completion(api_key=None, **kwargs):
+    return get_client(api_key).chat_completion(**kwargs)
+
+
+def configure_rate_limits(model, requests_per_minute, tokens_per_minute):
+    """Set the account limits of a model; applies to clients that have not used the model yet."""
+    MODEL_RATE_LIMITS[model] = {'requests_per_minute': requests_per_minute, 'tokens_per_minute': tokens_per_minute}
+
+
+def set_default_rate_limits(requests_per_minute=None, tokens_per_minute=None):
+    """Set the limits of models without limits of their own; applies to clients that have not used them yet."""
+    if requests_per_minute:
+        DEFAULT_RATE_LIMITS['requests_per_minute'] = requests_per_minute
+    if tokens_per_minute:
+        DEFAULT_RATE_LIMITS['tokens_per_minute'] = tokens_per_minute
+
+
+def load_rate_limits(path):
+    """Read the limits of an account tier from a JSON file.
+
+    The file maps models to {"requests_per_minute": ..., "tokens_per_minute": ...}. A
+    "default" entry sets the limits of the models not listed; a model may give only one of
+    the two limits and take the other from the defaults.
+    """
+    with open(path, 'r') as f:
+        limits = json.load(f)
+    default = limits.pop('default', {})
+    set_default_rate_limits(default.get('requests_per_minute'), default.get('tokens_per_minute'))
+    for model, model_limits in limits.items():
+        MODEL_RATE_LIMITS[model] = {name: model_limits[name] for name in ('requests_per_minute', 'tokens_per_minute')
+                                    if model_limits.get(name)}
+
+
+def load_rate_limits_from_env():
+    """Apply OPENAI_RATE_LIMITS_FILE, then OPENAI_RPM and OPENAI_TPM."""
+    try:
+        if os.environ.get(RATE_LIMITS_FILE_ENV):
+            load_rate_limits(os.environ[RATE_LIMITS_FILE_ENV])
+        set_default_rate_limits(int(os.environ.get(RPM_ENV) or 0), int(os.environ.get(TPM_ENV) or 0))
+    except (OSError, ValueError) as e:
+        print(f"Rate limits from the environment were not applied: {str(e)}")
+
+
+load_rate_limits_from_env()
+
+
+def set_response_cache_bypass(bypass):
+    """Skip cached responses (e.g. to deliberately re-roll a plan); fresh responses still refresh the cache.
+
+    Applies to the requests of the current context and of the section workers it starts,
+    so sessions of the app do not change each other's setting.
+    """
+    _bypass_response_cache.set(bypass)
+
+
+def get_response_cache_stats():
+    return response_cache.stats()
+
+
+def set_streaming(enabled):
+    """Stream the completions of the current context and of the workers it starts."""
+    _stream_responses.set(enabled)
+
+
+def set_max_concurrent_requests(max_requests):
+    """Cap the requests in flight at the same time.
+
+    A request takes its slot once its rate limiter lets it through, so requests waiting on
+    one model's limits do not hold back the others; a streamed request keeps it until it ends.
+    """
+    global _request_slots
+    _request_slots = threading.BoundedSemaphore(max_requests) if max_requests else None
+
+
+def _completion_response(model, content, finish_reason, completion_tokens):
+    return openai.util.convert_to_openai_object({
+        'object': 'chat.completion',
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                     'finish_reason': finish_reason}],
+        'usage': {'completion_tokens': completion_tokens}
+    })
@@ -0,0 +1,75 @@
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+
+from open_ai.backends import mock_backend_from_env
+
+DEFAULT_PORT = 8089
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """Serves /v1/chat/completions (JSON or server-sent events) and /v1/engines from the server's MockBackend."""
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/v1/engines', '/v1/models'):
+            models = self.server.backend.list_models()
+            self._send_json(200, {'object': 'list', 'data': [{'id': model, 'object': 'engine'} for model in models]})
+        else:
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        try:
+            response = self.server.backend.chat_completion(**request)
+        except openai.error.RateLimitError as e:
+            self._send_json(429, {'error': {'message': str(e), 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                            {'Retry-After': e.headers.get('retry-after', '1')})
+            return
+        if not request.get('stream'):
+            self._send_json(200, response.to_dict_recursive())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for chunk in response:
+            self.wfile.write(f"data: {json.dumps(chunk.to_dict_recursive())}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=DEFAULT_PORT, backend=None):
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockAPIHandler)
+    server.daemon_threads = True
+    server.backend = backend or mock_backend_from_env()
+    return server
+
+
+if __name__ == '__main__':
+    # python -m open_ai.mock_server, then run the app or CLI with OPENAI_API_BASE=http://127.0.0.1:8089/v1
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the OpenAI API (configured by MOCK_*).")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    server = serve(args.port)
+    print(f"Mock OpenAI API listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+import openai
+
+from open_ai.backends import get_backend
+
+# Model listings are refreshed at most this often per API key
+CATALOG_TTL = 60 * 60
+
+# Only these model families serve ChatCompletion; variants containing an excluded marker do not
+CHAT_MODEL_PREFIXES = ('gpt-3.5-turbo', 'gpt-4')
+NON_CHAT_MARKERS = ('instruct', 'embedding', 'audio', 'realtime', 'tts', 'whisper', 'transcribe', 'search', 'dall-e')
+
+# Context window (prompt + completion tokens) of known models, matched by longest prefix
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-4-turbo': 128000,
+    'gpt-4-1106-preview': 128000,
+    'gpt-4-0125-preview': 128000,
+    'gpt-4-vision-preview': 128000,
+    'gpt-4-32k': 32768,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo-16k': 16385,
+    'gpt-3.5-turbo-1106': 16385,
+    'gpt-3.5-turbo-0125': 16385,
+    'gpt-3.5-turbo-0613': 4096,
+    'gpt-3.5-turbo-0301': 4096,
+    'gpt-3.5-turbo': 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+
+# (input, output) price in USD per 1K tokens, matched by longest prefix
+MODEL_PRICING = {
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4-1106-preview': (0.01, 0.03),
+    'gpt-4-0125-preview': (0.01, 0.03),
+    'gpt-4-vision-preview': (0.01, 0.03),
+    'gpt-4-32k': (0.06, 0.12),
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo-16k': (0.003, 0.004),
+    'gpt-3.5-turbo-1106': (0.001, 0.002),
+    'gpt-3.5-turbo-0613': (0.0015, 0.002),
+    'gpt-3.5-turbo-0301': (0.0015, 0.002),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+}
+
+ModelInfo = namedtuple('ModelInfo', ['id', 'context_window', 'input_price', 'output_price',
+                                     'average_latency', 'latency_samples'])
+
+_listings = {}
+_latencies = None
+_lock = threading.Lock()
+
+
+def _by_prefix(table, model, default=None):
+    matches = [prefix for prefix in table if model and model.startswith(prefix)]
+    return table[max(matches, key=len)] if matches else default
+
+
+def context_window(model):
+    return _by_prefix(MODEL_CONTEXT_WINDOWS, model, DEFAULT_CONTEXT_WINDOW)
+
+
+def pricing(model):
+    """Return the (input, output) price per 1K tokens of a model, or (None, None) when it is unknown."""
+    return _by_prefix(MODEL_PRICING, model, (None, None))
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = pricing(model)
+    if input_price is None:
+        return None
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+
+def is_chat_model(model):
+    return model.startswith(CHAT_MODEL_PREFIXES) and not any(marker in model for marker in NON_CHAT_MARKERS)
+
+
+def historical_latencies(max_age=CATALOG_TTL):
+    """Return {model: (average section generation time, number of sections)} from the collected feedback.
+
+    New feedback is merged into the feedback dataset first, at most once per max_age.
+    """
+    global _latencies
+    with _lock:
+        if _latencies is not None and time.time() - _latencies[0] < max_age:
+            return _latencies[1]
+    latencies = {}
+    try:
+        from reporting.feedback_dataset import load_feedback_data
+        data = load_feedback_data()
+        if not data.empty:
+            times = (data[data['Section'] != 'Overall Feedback'].groupby('Model Name')['Generation Time']
+                     .agg(['mean', 'count']))
+            latencies = {model: (row['mean'], int(row['count'])) for model, row in times.iterrows() if row['count']}
+    except Exception as e:
+        print(f"Historical latencies are not available: {str(e)}")
+    with _lock:
+        _latencies = (time.time(), latencies)
+    return latencies
+
+
+def _list_model_ids(api_key, ttl):
+    key = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+    with _lock:
+        cached = _listings.get(key)
+    if cached and time.time() - cached[0] < ttl:
+        return cached[1]
+    try:
+        model_ids = sorted(get_backend().list_models(api_key))
+    except openai.error.OpenAIError as e:
+        if cached:  # A stale listing is better than none while the API is unreachable
+            print(f"Using the cached model listing: {str(e)}")
+            return cached[1]
+        raise
+    with _lock:
+        _listings[key] = (time.time(), model_ids)
+    return model_ids
+
+
+def get_catalog(api_key, ttl=CATALOG_TTL):
+    """Return {model id: ModelInfo} of the chat models available to an API key.
+
+    The listing is fetched once per TTL and key; the metadata comes from the tables
+    above and the generation times in the feedback dataset.
+    """
+    latencies = historical_latencies()
+    catalog = {}
+    for model in _list_model_ids(api_key, ttl):
+        if not is_chat_model(model):
+            continue
+        input_price, output_price = pricing(model)
+        average_latency, samples = latencies.get(model, (None, 0))
+        catalog[model] = ModelInfo(model, context_window(model), input_price, output_price, average_latency, samples)
+    return catalog
+
+
+def refresh(api_key=None):
+    """Drop the cached listings (of one key, or all of them) and latencies."""
+    global _latencies
+    with _lock:
+        if api_key is None:
+            _listings.clear()
+        else:
+            _listings.pop(hashlib.sha256(api_key.encode('utf-8')).hexdigest(), None)
+        _latencies = None
@@ -1,96 +1,202 @@
-from random import random
+import contextvars
+import hashlib
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import openai
-import time
+
+from open_ai.backends import get_backend
+from open_ai.client import chat_completion
+from open_ai.prompt_builder import build_prompt, chunk_requirements, REQUIREMENTS
+from open_ai.progress import run_subrequest
+from storage.cache_store import CacheStore, make_cache_key
+
+# Features and criticalities of one requirements text, shared by every section of a plan
+FeatureContext = namedtuple('FeatureContext', ['features', 'criticalities', 'requirements_hash'])
+
+_feature_contexts = {}
+_feature_contexts_lock = threading.Lock()
+
+# Large corpora are split into chunks whose features are extracted separately (map) and merged (reduce)
+FEATURE_CHUNK_TOKENS = 2000
+MAX_MERGED_FEATURES = 25
+CRITICALITY_RANKS = {'high': 0, 'medium': 1, 'low': 2}
+# Features of every chunk are kept on disk, so adding a document only extracts the chunks of that document
+feature_chunk_cache = CacheStore('feature_cache.db', 'chunk_features', max_entries=20000)
+
+# Sub-requests of all sections (per test type, role or feature) share one bounded pool
+MAX_FAN_OUT_WORKERS = 6
+_fan_out_executor = ThreadPoolExecutor(max_workers=MAX_FAN_OUT_WORKERS, thread_name_prefix="fan-out")
+
+
+def fan_out(func, items):
+    """Call func on every item concurrently and return the results in the order of items.
+
+    Each call runs in a copy of the caller's context, so its requests are reported to the
+    progress of the section that issued them, as the sub-request of its position in items.
+    """
+    futures = [_fan_out_executor.submit(contextvars.copy_context().run, run_subrequest, index, func, item)
+               for index, item in enumerate(items)]
+    return [future.result() for future in futures]
+
 
 def list_engines(api_key):
     """Retrieve and list all available OpenAI engines."""
-    openai.api_key = api_key
-    response = openai.Engine.list()
-    return [engine['id'] for engine in response['data']]
+    return get_backend().list_models(api_key)
+
+def parse_features(features_criticality):
+    """Parse a "Feature: Criticality" reply, given either one per line or comma separated."""
+    lines = [line for line in features_criticality.splitlines() if line.strip()]
+    entries = lines if len(lines) > 1 else features_criticality.split(',')
+    features, criticalities = [], []
+    for entry in entries:
+        # Drop list markers such as "1.", "-" or "**" around the feature name
+        entry = re.sub(r'^\s*(?:[-*\u2022]+|\d+[.)])\s*', '', entry).replace('**', '').strip()
+        if not entry:
+            continue
+        feature, _, criticality = entry.partition(':')
+        if feature.strip():
+            features.append(feature.strip())
+            criticalities.append(criticality.strip() or 'Unknown')
+    return features, criticalities
+
 
 def extract_main_features_and_criticality(engine, user_stories, api_key):
-    """Extract main features from user stories using OpenAI and assess their criticality, with retry logic."""
-    openai.api_key = api_key
-    attempt_count = 0
-    max_attempts = 5
-    while attempt_count < max_attempts:
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Identify and evaluate the criticality of main features in the user stories."},
-                    {"role": "user", "content": f"User stories:\n\n{user_stories}\n\nList the main features and assess their criticality."}
-                ],
-                max_tokens=250  # Adjusted for a more comprehensive response
-            )
-            features_criticality = response.choices[0].message['content'].strip()
-            features = [feature.split(':')[0].strip() for feature in features_criticality.split(',')]
-            criticalities = [feature.split(':')[1].strip() if ':' in feature else 'Unknown' for feature in features_criticality.split(',')]
-            return features, criticalities
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default to 10 seconds if retry_after is not provided
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            attempt_count += 1
-            if attempt_count == max_attempts:
-                print("Maximum retry attempts reached. Failing operation.")
-                break  # Exit loop after max retries
-        except Exception as e:
-            print(f"An unexpected error occurred: {str(e)}")
-            break  # Exit loop on unknown error
+    """Extract main features from user stories using OpenAI and assess their criticality."""
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": "Identify and evaluate the criticality of main features in the user stories."},
+                {"role": "user", "content": f"User stories:\n\n{user_stories}\n\nList the main features and assess their criticality."}
+            ],
+            max_tokens=250  # Adjusted for a more comprehensive response
+        )
+        features_criticality = response.choices[0].message['content'].strip()
+        return parse_features(features_criticality)
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {str(e)}")
     return [], []  # Return empty lists if retries do not succeed
 
 
-def generate_section(engine, section_name, user_stories, api_key, options):
+def _extract_chunk_features(engine, chunk, api_key):
+    key = make_cache_key('features', engine, chunk)
+    cached = feature_chunk_cache.get(key)
+    if cached is not None:
+        return cached['features'], cached['criticalities']
+    features, criticalities = extract_main_features_and_criticality(engine, chunk, api_key)
+    if features:  # Failed chunks are extracted again next time
+        feature_chunk_cache.set(key, {'features': features, 'criticalities': criticalities})
+    return features, criticalities
+
+
+def merge_features(chunk_results, max_features=MAX_MERGED_FEATURES):
+    """Merge the features of all chunks, de-duplicated by name, keeping the highest criticality.
+
+    When more than max_features remain, the most critical and most frequently mentioned
+    ones are kept. Features stay in the order they first appear in.
+    """
+    merged = {}
+    for features, criticalities in chunk_results:
+        for feature, criticality in zip(features, criticalities):
+            name = re.sub(r'[^a-z0-9]+', ' ', feature.lower()).strip()
+            if not name:
+                continue
+            if name not in merged:
+                merged[name] = {'feature': feature, 'criticality': criticality, 'mentions': 0, 'order': len(merged)}
+            entry = merged[name]
+            entry['mentions'] += 1
+            if CRITICALITY_RANKS.get(criticality.lower(), 3) < CRITICALITY_RANKS.get(entry['criticality'].lower(), 3):
+                entry['criticality'] = criticality
+    entries = sorted(merged.values(),
+                     key=lambda entry: (CRITICALITY_RANKS.get(entry['criticality'].lower(), 3), -entry['mentions']))
+    entries = sorted(entries[:max_features], key=lambda entry: entry['order'])
+    return [entry['feature'] for entry in entries], [entry['criticality'] for entry in entries]
+
+
+def extract_features_map_reduce(engine, documents, api_key):
+    """Extract the features of every chunk of every document concurrently and merge them.
+
+    Returns (features, criticalities, complete); complete is False when any chunk failed.
+    """
+    chunks = [chunk for document in documents if document
+              for chunk in chunk_requirements(document, FEATURE_CHUNK_TOKENS, engine)]
+    chunk_results = fan_out(lambda chunk: _extract_chunk_features(engine, chunk, api_key), chunks) \
+        if len(chunks) > 1 else [_extract_chunk_features(engine, chunk, api_key) for chunk in chunks]
+    complete = bool(chunk_results) and all(features for features, _ in chunk_results)
+    if len(chunk_results) == 1:
+        return chunk_results[0] + (complete,)
+    return merge_features(chunk_results) + (complete,)
+
+
+def hash_requirements(user_stories):
+    return hashlib.sha256(user_stories.encode('utf-8')).hexdigest()
+
+
+def get_feature_context(engine, user_stories, api_key, documents=None):
+    """Return the features and criticalities of the user stories, extracting them only once per text and model.
+
+    documents are the texts the user stories were concatenated from; they are chunked
+    per document so that the chunk results can be reused when documents are added.
+    """
+    requirements_hash = hash_requirements(user_stories)
+    key = (engine, requirements_hash)
+    with _feature_contexts_lock:
+        if key in _feature_contexts:
+            return _feature_contexts[key]
+    features, criticalities, complete = extract_features_map_reduce(engine, documents or [user_stories], api_key)
+    feature_context = FeatureContext(features, criticalities, requirements_hash)
+    if complete:  # A partial result is not kept, so the failed chunks are extracted again on the next call
+        with _feature_contexts_lock:
+            _feature_contexts[key] = feature_context
+    return feature_context
+
+
+def generate_section(engine, section_name, user_stories, api_key, options, feature_context=None):
     """Generate a specific section of the test plan based on section requirements."""
-    openai.api_key = api_key
-    main_features, criticalities = extract_main_features_and_criticality(engine, user_stories, api_key)
+    if feature_context is None:
+        feature_context = get_feature_context(engine, user_stories, api_key)
 
     # Combine features and criticalities into a formatted string
     features_with_criticality = [f"{feature}: {criticality}" for feature, criticality in
-                                 zip(main_features, criticalities)]
+                                 zip(feature_context.features, feature_context.criticalities)]
 
-    prompt = f"""
+    system_prompt = f"Generate the {section_name} section with a focus on essential requirements."
+    # Only the requirement passages most relevant to this section that fit the token budget are included
+    prompt = build_prompt(f"""
     Section: {section_name}
     Application Name: {options['application_name']}
     Domain: {options['domain']}
     Main Features: {', '.join(features_with_criticality)}
     Keywords: {options['keywords']}
-    User Stories: {user_stories}
+    User Stories: {REQUIREMENTS}
     Please provide concise details for this section focusing on the needs for this "{section_name}" of a test plan document, keeping in mind the domain and main features!.
-    """
-    attempt_count = 0
-    while attempt_count < 10:  # Limit the number of retries to avoid infinite loops
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system",
-                     "content": f"Generate the {section_name} section with a focus on essential requirements."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e,
-                                                 'retry_after') else 10  # Use 10 seconds if retry_after is not available
-            print(f"Rate limit exceeded. Waiting for {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            raise e
-    raise Exception("Failed to generate section after multiple attempts due to rate limiting.")
+    """, user_stories, engine, query=f"{section_name} {options['keywords']} {' '.join(feature_context.features)}",
+        max_tokens=1000, system_prompt=system_prompt)
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system",
+                 "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0.7
+        )
+        return response.choices[0].message['content']
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise e
 
 
 def generate_test_plan_identifier(engine, api_key, options, retries=5, base_delay=1.0):
     """Generate the 'Test Plan Identifier' section with specific metadata, with retries for handling rate limits."""
-    openai.api_key = api_key
     prompt = f"""
     Generate a unique identifier and creator information for a test plan.
     Application Name: {options['application_name']}
@@ -98,74 +204,59 @@ def generate_test_plan_identifier(engine, api_key, options, retries=5, base_dela
     Date: {options['creation_date']}
     Please provide a test plan identifier that includes a unique number and details about who created the test plan and when it was created.
     """
-    for attempt in range(retries):
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Create a unique identifier for the test plan."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.5
-            )
-            return response.choices[0].message['content'].strip()
-        except openai.error.RateLimitError:
-            if attempt < retries - 1:
-                sleep_time = base_delay * (2 ** attempt) + random.uniform(0, 1)  # Exponential backoff with jitter
-                print(f"Rate limit exceeded. Retrying in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
-            else:
-                print("Max retries exceeded. Failed to generate test plan identifier.")
-                raise
-        except openai.error.OpenAIError as e:
-            print(f"Failed to generate test plan identifier: {str(e)}")
-            raise
+    try:
+        # Retries and backoff are handled by the client; the arguments tune them for this request
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": "Create a unique identifier for the test plan."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=300,
+            temperature=0.5,
+            max_retries=retries - 1,
+            base_delay=base_delay
+        )
+        return response.choices[0].message['content'].strip()
+    except openai.error.OpenAIError as e:
+        print(f"Failed to generate test plan identifier: {str(e)}")
+        raise
 
 
 
 
 def ai_based_testing_estimation(engine, user_stories, feature_details, num_testers, testing_type, api_key):
     """Estimate testing efforts using AI based on the provided number of testers and testing type."""
-    openai.api_key = api_key
     prompt = f"""
     Estimate the effort in man-days needed for {testing_type} given the following details:
     Features and their descriptions: {feature_details}
     Number of Testers: {num_testers}
     Please provide a detailed estimation considering the complexity and workload.
     """
-    attempt_count = 0
-    while attempt_count < 5:  # Limit the number of retries
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Calculate testing effort based on the details provided."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.5
-            )
-            estimated_effort = response.choices[0].message['content'].strip()
-            return f"{testing_type} Estimated Effort: {estimated_effort} man-days"
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default to 10 seconds if not specified
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An error occurred while estimating efforts for {testing_type}: {str(e)}")
-            if attempt_count == 4:  # Last attempt
-                return f"{testing_type} Estimation failed after multiple attempts."
-            attempt_count += 1
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            return f"{testing_type} Estimation error, please check logs."
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": "Calculate testing effort based on the details provided."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.5
+        )
+        estimated_effort = response.choices[0].message['content'].strip()
+        return f"{testing_type} Estimated Effort: {estimated_effort} man-days"
+    except openai.error.OpenAIError as e:
+        print(f"An error occurred while estimating efforts for {testing_type}: {str(e)}")
+        return f"{testing_type} Estimation failed after multiple attempts."
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return f"{testing_type} Estimation error, please check logs."
 
 
 def generate_excluded_features_section(engine, section_name, user_stories, features, api_key, options):
     """Generate the 'Features not to be Tested' section with a focus on why these features are excluded."""
-    openai.api_key = api_key
     prompt = f"""
     Section: {section_name}
     Application Name: {options['application_name']}
@@ -177,33 +268,25 @@ def generate_excluded_features_section(engine, section_name, user_stories, featu
     Keywords: {options['keywords']}
     Please elaborate on the rationale for excluding certain features from the testing process, ensuring clarity and justification for project stakeholders.
     """
-    attempt_count = 0
-    while attempt_count < 10:  # Limit the number of retries to avoid infinite loops
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": f"Generate the {section_name} section focused on non-testing rationale."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10
-            print(f"Rate limit exceeded. Waiting for {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            raise e
-    raise Exception("Failed to generate section after multiple attempts due to rate limiting.")
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": f"Generate the {section_name} section focused on non-testing rationale."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1000,
+            temperature=0.7
+        )
+        return response.choices[0].message['content']
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise e
 
 
 def generate_test_deliverables_section(engine, api_key, options):
     """Generate the 'Test Deliverables' section focused on actual testing outputs."""
-    openai.api_key = api_key
     prompt = f"""
     Section: Test Deliverables
     Application Name: {options['application_name']}
@@ -223,7 +306,8 @@ def generate_test_deliverables_section(engine, api_key, options):
     Discuss the importance of each deliverable and how they contribute to the project's success.
     """
     try:
-        response = openai.ChatCompletion.create(
+        response = chat_completion(
+            api_key=api_key,
             model=engine,
             messages=[
                 {"role": "system", "content": "Generate a comprehensive list of testing deliverables with descriptions."},
@@ -239,7 +323,6 @@ def generate_test_deliverables_section(engine, api_key, options):
 
 def generate_environmental_needs_section(engine, api_key, options):
     """Generate the 'Environmental Needs' section focused on testing environments and resources."""
-    openai.api_key = api_key
     prompt = f"""
     Section: Environmental Needs
     Application Name: {options['application_name']}
@@ -257,7 +340,8 @@ def generate_environmental_needs_section(engine, api_key, options):
     Detail how these environments and resources contribute to the testing process and the importance of configuring them appropriately.
     """
     try:
-        response = openai.ChatCompletion.create(
+        response = chat_completion(
+            api_key=api_key,
             model=engine,
             messages=[
                 {"role": "system", "content": "Generate detailed requirements for the testing environments necessary for the project."},
@@ -275,7 +359,6 @@ def generate_environmental_needs_section(engine, api_key, options):
 
 def generate_schedule_section(engine, api_key, options):
     """Generate detailed schedules for various types of testing based on availability and testing needs."""
-    openai.api_key = api_key
 
     # Mapping testing types to their respective requirement flags from options
     test_types = {
@@ -285,34 +368,37 @@ def generate_schedule_section(engine, api_key, options):
         'Security Testing': options['security_testing']
     }
 
-    schedules = []
-    for test_type, is_required in test_types.items():
-        if is_required:  # Check if testing is required
-            prompt = f"""
-            Section: Schedule
-            Application Name: {options['application_name']}
-            Generate a detailed schedule for {test_type}. Consider the number of testers and the complexity of the application to define:
-            - Test Planning: Define the timeframe for initial planning activities.
-            - Test Design: Specify the period for creating detailed test cases and scripts.
-            - Test Execution: Outline the execution phase timeline.
-            - Test Reporting: Indicate when and how test results will be reviewed and reported.
-            """
-
-            try:
-                response = openai.ChatCompletion.create(
-                    model=engine,
-                    messages=[
-                        {"role": "system", "content": "Generate a detailed testing schedule."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.5
-                )
-                schedule_details = response.choices[0].message['content']
-                schedules.append(f"{test_type} Schedule:\n{schedule_details}")
-            except openai.error.OpenAIError as e:
-                print(f"An error occurred while generating the schedule for {test_type}: {str(e)}")
-                schedules.append(f"{test_type} Schedule: Error generating schedule.")
+    def generate_schedule(test_type):
+        prompt = f"""
+        Section: Schedule
+        Application Name: {options['application_name']}
+        Generate a detailed schedule for {test_type}. Consider the number of testers and the complexity of the application to define:
+        - Test Planning: Define the timeframe for initial planning activities.
+        - Test Design: Specify the period for creating detailed test cases and scripts.
+        - Test Execution: Outline the execution phase timeline.
+        - Test Reporting: Indicate when and how test results will be reviewed and reported.
+        """
+
+        try:
+            response = chat_completion(
+                api_key=api_key,
+                model=engine,
+                messages=[
+                    {"role": "system", "content": "Generate a detailed testing schedule."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=500,
+                temperature=0.5
+            )
+            schedule_details = response.choices[0].message['content']
+            return f"{test_type} Schedule:\n{schedule_details}"
+        except openai.error.OpenAIError as e:
+            print(f"An error occurred while generating the schedule for {test_type}: {str(e)}")
+            return f"{test_type} Schedule: Error generating schedule."
+
+    # Schedules of all required test types are requested concurrently
+    required_test_types = [test_type for test_type, is_required in test_types.items() if is_required]
+    schedules = fan_out(generate_schedule, required_test_types)
 
     return "\n\n".join(schedules)
 
@@ -321,8 +407,6 @@ def generate_schedule_section(engine, api_key, options):
 
 def generate_responsibilities_section(engine, api_key, options):
     """Generate responsibilities based on the team composition and testing requirements."""
-    openai.api_key = api_key
-    responsibilities = []
 
     # Define roles based on the provided counts
     roles = {
@@ -340,8 +424,8 @@ def generate_responsibilities_section(engine, api_key, options):
     if not active_roles:
         return "No responsibilities assigned due to lack of testing personnel."
 
-    # Generate responsibilities for each active role
-    for role, count in active_roles.items():
+    def generate_role_responsibilities(role):
+        count = active_roles[role]
         prompt = f"""
         Role: {role}
         Count: {count}
@@ -352,7 +436,8 @@ def generate_responsibilities_section(engine, api_key, options):
         """
 
         try:
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
+                api_key=api_key,
                 model=engine,
                 messages=[
                     {"role": "system", "content": "Generate detailed responsibilities for testing roles."},
@@ -362,18 +447,20 @@ def generate_responsibilities_section(engine, api_key, options):
                 temperature=0.5
             )
             role_responsibilities = response.choices[0].message['content']
-            responsibilities.append(f"{role} ({count} members): {role_responsibilities}")
+            return f"{role} ({count} members): {role_responsibilities}"
         except openai.error.OpenAIError as e:
             print(f"An error occurred while generating responsibilities for {role}: {str(e)}")
-            responsibilities.append(f"{role} ({count} members): Error in generating responsibilities.")
+            return f"{role} ({count} members): Error in generating responsibilities."
+
+    # Generate responsibilities for each active role concurrently
+    responsibilities = fan_out(generate_role_responsibilities, list(active_roles))
 
     return "\n\n".join(responsibilities)
 
 
 
 def generate_introduction_section(engine, api_key, options):
-    """Generate an introduction section that describes the application, its domain, tech stack, and the objectives of the test plan with retry logic."""
-    openai.api_key = api_key
+    """Generate an introduction section that describes the application, its domain, tech stack, and the objectives of the test plan."""
     # Constructing the tech stack description with specific technology names
     tech_stack_description = ', '.join([f"{tech}: {value}" for tech, value in options['tech_stack'].items() if value and value != 'Other'])
 
@@ -383,83 +470,59 @@ def generate_introduction_section(engine, api_key, options):
     Tech Stack: {tech_stack_description}
     Describe the application's main functionality and its relevance to the specified domain. Outline the objectives of the test plan, focusing on how the testing will ensure the application meets its design and functionality requirements.
     """
-    attempt_count = 0
-    while attempt_count < 5:  # Retry up to 5 times
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Generate an introduction for the test plan."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.5
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default to 10 seconds if retry_after is not available
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            attempt_count += 1
-            if attempt_count == 5:
-                raise Exception("Maximum retry attempts reached, unable to generate introduction.") from e
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            if attempt_count == 5:
-                return "An unexpected error occurred while generating the introduction section."
-            attempt_count += 1
-
-    return "Failed to generate the introduction section after multiple attempts."
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": "Generate an introduction for the test plan."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.5
+        )
+        return response.choices[0].message['content']
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise Exception("Maximum retry attempts reached, unable to generate introduction.") from e
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return "An unexpected error occurred while generating the introduction section."
 
 
 
 
 def generate_glossary_section(engine, api_key, user_stories_text):
     """Generate a glossary section that extracts and defines abbreviations and jargons from the user stories."""
-    openai.api_key = api_key
-    prompt = f"""
+    system_prompt = "Extract and define technical terms for the glossary section."
+    prompt = build_prompt(f"""
     Identify and define any abbreviations, jargons, or technical terms found in the following user stories:
-    {user_stories_text}
+    {REQUIREMENTS}
     Provide concise definitions for each identified term to be included in the glossary of a test plan document.
-    """
-    attempt_count = 0
-    while attempt_count < 5:  # Retry up to 5 times
-        try:
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Extract and define technical terms for the glossary section."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,  # Increased token limit for comprehensive extraction
-                temperature=0.5
-            )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default to 10 seconds if retry_after is not available
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            attempt_count += 1
-            if attempt_count == 5:
-                raise Exception("Maximum retry attempts reached, unable to generate glossary.") from e
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            if attempt_count == 5:
-                return "An unexpected error occurred while generating the glossary section."
-            attempt_count += 1
-
-    return "Failed to generate the glossary section after multiple attempts."
+    """, user_stories_text, engine, query="glossary abbreviations acronyms terms definitions",
+        max_tokens=500, system_prompt=system_prompt)
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,  # Increased token limit for comprehensive extraction
+            temperature=0.5
+        )
+        return response.choices[0].message['content']
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise Exception("Maximum retry attempts reached, unable to generate glossary.") from e
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return "An unexpected error occurred while generating the glossary section."
 
 
 def generate_remaining_test_tasks(engine, api_key, user_stories_text, options):
     """Generate a section outlining remaining test tasks after the initial planning phase."""
-    openai.api_key = api_key
     prompt = f"""
     Given the initial planning has been completed for the application '{options['application_name']}' within the domain '{options['domain']}', list all remaining tasks that need to be addressed in the testing lifecycle. Include tasks related to:
     - Test Scripting
@@ -468,77 +531,58 @@ def generate_remaining_test_tasks(engine, api_key, user_stories_text, options):
     - Final Validation and Closure
     Context: The initial test planning has covered the fundamental setup and strategy outline. The application involves technologies such as {', '.join(options['tech_stack'].values())} and requires both functional and non-functional testing approaches.
     """
-    attempt_count = 0
-    while attempt_count < 5:  # Retry logic for robustness
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": "Generate a detailed list of remaining testing tasks."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,  # Sufficient tokens to cover detailed tasks
+            temperature=0.5
+        )
+        return response.choices[0].message['content']
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise Exception("Maximum retry attempts reached for generating remaining test tasks.") from e
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return "An unexpected error occurred while generating the remaining test tasks section."
+
+
+def generate_features_to_be_tested_section(engine, user_stories, api_key, options, feature_context=None):
+    """Generate the 'Features to be Tested' section with details about each feature's importance and necessity for testing."""
+    if feature_context is None:
+        feature_context = get_feature_context(engine, user_stories, api_key)
+    features, criticalities = feature_context.features, feature_context.criticalities
+
+    def generate_feature_detail(feature_with_criticality):
+        feature, criticality = feature_with_criticality
+        prompt = f"""
+        Feature: {feature}
+        Criticality: {criticality}
+        Explain why this feature is critical to be tested and what risks are involved if it is not thoroughly tested.
+        """
         try:
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
+                api_key=api_key,
                 model=engine,
                 messages=[
-                    {"role": "system", "content": "Generate a detailed list of remaining testing tasks."},
+                    {"role": "system", "content": "Generate a detailed explanation for testing a feature."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=500,  # Sufficient tokens to cover detailed tasks
+                max_tokens=500,
                 temperature=0.5
             )
-            return response.choices[0].message['content']
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default wait time
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
+            detail = response.choices[0].message['content'].strip()
+            return f"{feature} ({criticality}): {detail}"
         except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            if attempt_count == 5:
-                raise Exception("Maximum retry attempts reached for generating remaining test tasks.") from e
-            attempt_count += 1
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            if attempt_count == 5:
-                return "An unexpected error occurred while generating the remaining test tasks section."
-            attempt_count += 1
-
-    return "Failed to generate the remaining test tasks section after multiple attempts."
-
+            print(f"Failed to generate detail for feature {feature}: {str(e)}")
+            return f"{feature} ({criticality}): Detailed explanation could not be generated after multiple attempts."
 
-def generate_features_to_be_tested_section(engine, user_stories, api_key, options):
-    """Generate the 'Features to be Tested' section with details about each feature's importance and necessity for testing."""
-    openai.api_key = api_key
-    features, criticalities = extract_main_features_and_criticality(engine, user_stories, api_key)
-
-    feature_details = []
-    max_retries = 3  # Maximum number of retries for each feature
-    for feature, criticality in zip(features, criticalities):
-        attempt_count = 0
-        while attempt_count < max_retries:
-            try:
-                prompt = f"""
-                Feature: {feature}
-                Criticality: {criticality}
-                Explain why this feature is critical to be tested and what risks are involved if it is not thoroughly tested.
-                """
-                response = openai.ChatCompletion.create(
-                    model=engine,
-                    messages=[
-                        {"role": "system", "content": "Generate a detailed explanation for testing a feature."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.5
-                )
-                detail = response.choices[0].message['content'].strip()
-                feature_details.append(f"{feature} ({criticality}): {detail}")
-                break  # Break the loop if successful
-            except openai.error.RateLimitError as e:
-                wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default wait time
-                print(f"Rate limit exceeded for feature {feature}. Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-                attempt_count += 1
-            except openai.error.OpenAIError as e:
-                print(f"Failed to generate detail for feature {feature} on attempt {attempt_count + 1}: {str(e)}")
-                attempt_count += 1
-            if attempt_count == max_retries:
-                feature_details.append(
-                    f"{feature} ({criticality}): Detailed explanation could not be generated after multiple attempts.")
+    # Every feature is explained by its own request, all issued concurrently
+    feature_details = fan_out(generate_feature_detail, list(zip(features, criticalities)))
 
     return "\n".join(feature_details)
 
@@ -546,42 +590,29 @@ def generate_features_to_be_tested_section(engine, user_stories, api_key, option
 
 def generate_staffing_and_training_needs(engine, user_stories, features, api_key, options):
     """Generate staffing and training needs based on the complexity of the project."""
-    openai.api_key = api_key
-    attempt_count = 0
-    while attempt_count < 5:  # Limit the number of retries
-        try:
-            prompt = f"""
-            Given the following details of a software project, determine the staffing and training needs for various types of testing:
-            Application Name: {options['application_name']}
-            Domain: {options['domain']}
-            Features: {', '.join(features)}
-            User Stories: {user_stories}
-            Current Technical Stack: {options['tech_stack']}
-            Evaluate how many testers are needed for functional, automation, performance, and security testing. Also, specify the types of training that would be beneficial for the testing team.
-            """
-            response = openai.ChatCompletion.create(
-                model=engine,
-                messages=[
-                    {"role": "system", "content": "Calculate the required testing resources and training needs."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.5
-            )
-            return response.choices[0].message['content'].strip()
-        except openai.error.RateLimitError as e:
-            wait_time = e.retry_after if hasattr(e, 'retry_after') else 10  # Default to 10 seconds
-            print(f"Rate limit exceeded. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-            attempt_count += 1
-        except openai.error.OpenAIError as e:
-            print(f"An OpenAI error occurred: {str(e)}")
-            if attempt_count == 4:  # Last attempt
-                raise e  # Optionally raise an error or handle it as needed
-            attempt_count += 1
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            if attempt_count == 4:  # Last attempt
-                raise e
-            attempt_count += 1
-    return "Unable to generate staffing and training needs after several attempts."
+    system_prompt = "Calculate the required testing resources and training needs."
+    prompt = build_prompt(f"""
+    Given the following details of a software project, determine the staffing and training needs for various types of testing:
+    Application Name: {options['application_name']}
+    Domain: {options['domain']}
+    Features: {', '.join(features)}
+    User Stories: {REQUIREMENTS}
+    Current Technical Stack: {options['tech_stack']}
+    Evaluate how many testers are needed for functional, automation, performance, and security testing. Also, specify the types of training that would be beneficial for the testing team.
+    """, user_stories, engine, query=f"staffing training testers skills {' '.join(features)}",
+        max_tokens=500, system_prompt=system_prompt)
+    try:
+        response = chat_completion(
+            api_key=api_key,
+            model=engine,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.5
+        )
+        return response.choices[0].message['content'].strip()
+    except openai.error.OpenAIError as e:
+        print(f"An OpenAI error occurred: {str(e)}")
+        raise e
@@ -0,0 +1,121 @@
+import contextvars
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# Progress event kinds, in the order they normally occur for a section
+SECTION_STARTED = 'section_started'
+REQUEST_SENT = 'request_sent'
+FIRST_TOKEN = 'first_token'
+TOKENS = 'tokens'
+RESPONSE_RECEIVED = 'response_received'
+SECTION_COMPLETED = 'section_completed'
+SECTION_PERSISTED = 'section_persisted'
+
+ProgressEvent = namedtuple('ProgressEvent', ['section', 'kind', 'timestamp', 'data'])
+
+# (reporter, section) of the section being generated in the current thread
+_current_section = contextvars.ContextVar('current_section', default=None)
+# Position of the current thread's requests among the fanned-out sub-requests of its section, e.g. (2,)
+_current_subrequest = contextvars.ContextVar('current_subrequest', default=())
+
+
+class ProgressReporter:
+    """Collects progress events from worker threads and hands them to a handler on the owning thread.
+
+    Workers only enqueue events, so the handler is free to update Streamlit elements:
+    it runs whenever the owning thread calls dispatch(). The reporter also keeps timing
+    metrics of every section, derived from the same events.
+    """
+
+    def __init__(self, handler=None):
+        self.handler = handler
+        self._events = queue.Queue()
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def emit(self, section, kind, **data):
+        event = ProgressEvent(section, kind, time.time(), data)
+        self._record(event)
+        self._events.put(event)
+
+    def _record(self, event):
+        with self._metrics_lock:
+            metrics = self._metrics.setdefault(event.section, {'started_at': None, 'first_token_at': None,
+                                                               'completed_at': None, 'tokens': 0,
+                                                               'streamed_tokens': 0, 'prompt_tokens': 0,
+                                                               'requests': 0, 'cached_requests': 0})
+            # Cached and unstreamed responses arrive whole, so they count as tokens but not towards the latencies
+            cached = event.data.get('cached', False)
+            timed = not cached and event.data.get('streamed', True)
+            if event.kind == SECTION_STARTED:
+                metrics['started_at'] = event.timestamp
+            elif event.kind == REQUEST_SENT:
+                metrics['prompt_tokens'] += event.data.get('prompt_tokens', 0)
+                metrics['requests'] += 1
+                metrics['cached_requests'] += cached
+            elif event.kind == FIRST_TOKEN and timed and metrics['first_token_at'] is None:
+                metrics['first_token_at'] = event.timestamp
+            elif event.kind == TOKENS:
+                metrics['tokens'] += event.data.get('count', 0)
+                if timed:
+                    metrics['streamed_tokens'] += event.data.get('count', 0)
+            elif event.kind == SECTION_COMPLETED:
+                metrics['completed_at'] = event.timestamp
+
+    def section_metrics(self, section):
+        """Return the time to first token, the streaming rate (tokens per second) and the prompt and completion
+        tokens of a section, and whether all of its responses came from the cache.
+
+        Both latencies are measured on the streamed requests only; they are None for a
+        section answered entirely from the cache or without streaming.
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics.get(section, {}))
+        time_to_first_token = tokens_per_second = None
+        if metrics.get('first_token_at') and metrics.get('started_at'):
+            time_to_first_token = metrics['first_token_at'] - metrics['started_at']
+            if metrics.get('completed_at') and metrics['completed_at'] > metrics['first_token_at']:
+                tokens_per_second = metrics['streamed_tokens'] / (metrics['completed_at'] - metrics['first_token_at'])
+        return {"Time to First Token": time_to_first_token, "Tokens per Second": tokens_per_second,
+                "Prompt Tokens": metrics.get('prompt_tokens', 0), "Completion Tokens": metrics.get('tokens', 0),
+                "Cached": bool(metrics.get('requests')) and metrics['cached_requests'] == metrics['requests']}
+
+    def track(self, section, func, *args, **kwargs):
+        """Run func as the generation of section, reporting its start and completion."""
+        token = _current_section.set((self, section))
+        self.emit(section, SECTION_STARTED)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.emit(section, SECTION_COMPLETED)
+            _current_section.reset(token)
+
+    def dispatch(self):
+        """Pass every pending event to the handler. Call this from the thread that owns the UI."""
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+            if self.handler:
+                self.handler(event)
+
+
+def run_subrequest(index, func, *args):
+    """Run func as sub-request index of the current one. Call this in a copy of the caller's context.
+
+    Events reported by func carry the sub-request in their data, so the streams of
+    concurrent sub-requests of one section can be told apart.
+    """
+    _current_subrequest.set(_current_subrequest.get() + (index,))
+    return func(*args)
+
+
+def report(kind, **data):
+    """Report an event for the section being generated in this thread; a no-op outside a tracked section."""
+    current = _current_section.get()
+    if current is not None:
+        reporter, section = current
+        reporter.emit(section, kind, subrequest=_current_subrequest.get(), **data)
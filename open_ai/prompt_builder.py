@@ -0,0 +1,144 @@
+import contextvars
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate of 4 characters per token
+    tiktoken = None
+
+from open_ai.model_catalog import context_window
+
+# Placeholder marking where the requirement passages go in a prompt template
+REQUIREMENTS = '<<requirements>>'
+
+# Tokens of requirement text allowed in one prompt by default: the passages most relevant to a section fit,
+# and requests stay small against the tokens-per-minute limit
+DEFAULT_PROMPT_TOKEN_BUDGET = 3000
+# Set per context; None means as much as the context window allows
+_prompt_token_budget = contextvars.ContextVar('prompt_token_budget', default=DEFAULT_PROMPT_TOKEN_BUDGET)
+# Tokens kept free for message framing and counting inaccuracies
+SAFETY_MARGIN_TOKENS = 100
+CHUNK_TOKENS = 300
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def set_prompt_token_budget(budget):
+    """Cap the requirement tokens of the prompts built in the current context and the workers it starts.
+
+    0 (or None) fills the model's context window instead.
+    """
+    _prompt_token_budget.set(budget or None)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def count_tokens(text, model=None):
+    """Count the tokens of text for model, using tiktoken when it is installed."""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    return len(_encoding(model or 'gpt-3.5-turbo').encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    # Every message carries a few tokens of framing besides its content
+    return sum(count_tokens(message.get('content') or '', model) + 4 for message in messages or []) + 2
+
+
+def _split_long_passage(passage, chunk_tokens, model):
+    pieces = []
+    current = ''
+    for sentence in re.split(r'(?<=[.!?])\s+|\n', passage):
+        if current and count_tokens(current + ' ' + sentence, model) > chunk_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+@lru_cache(maxsize=16)
+def chunk_requirements(user_stories, chunk_tokens=CHUNK_TOKENS, model=None):
+    """Split the requirements into passages of about chunk_tokens, on paragraph and sentence boundaries."""
+    passages = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', user_stories):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph, model) > chunk_tokens:
+            if current:
+                passages.append(current)
+                current = ''
+            passages.extend(_split_long_passage(paragraph, chunk_tokens, model))
+        elif current and count_tokens(current + '\n\n' + paragraph, model) > chunk_tokens:
+            passages.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return tuple(passages)
+
+
+def rank_passages(passages, query):
+    """Order passage indexes by relevance to the query terms (term frequency weighted by rarity)."""
+    passage_terms = [Counter(_WORD_PATTERN.findall(passage.lower())) for passage in passages]
+    query_terms = set(_WORD_PATTERN.findall(query.lower()))
+    document_frequency = Counter(term for terms in passage_terms for term in query_terms if term in terms)
+
+    def score(index):
+        terms = passage_terms[index]
+        length = sum(terms.values()) or 1
+        return sum((terms[term] / length) * math.log(1 + len(passages) / document_frequency[term])
+                   for term in query_terms if term in terms)
+
+    return sorted(range(len(passages)), key=lambda index: (-score(index), index))
+
+
+def fit_requirements(user_stories, model, query, budget):
+    """Return the passages most relevant to query that fit in budget tokens, in their original order.
+
+    The requirements are returned unchanged when they fit as a whole.
+    """
+    if budget <= 0:
+        return ''
+    if count_tokens(user_stories, model) <= budget:
+        return user_stories
+    passages = chunk_requirements(user_stories, model=model)
+    selected = []
+    used = 0
+    for index in rank_passages(passages, query):
+        tokens = count_tokens(passages[index], model) + 2
+        if used + tokens <= budget:
+            selected.append(index)
+            used += tokens
+    return '\n\n'.join(passages[index] for index in sorted(selected))
+
+
+def build_prompt(template, user_stories, model, query, max_tokens, system_prompt=''):
+    """Fill the REQUIREMENTS placeholder of template with the requirements that fit the token budget.
+
+    The budget is what is left of the model's context window after the rest of the prompt,
+    the system prompt and the completion (max_tokens), capped by set_prompt_token_budget.
+    """
+    reserved = (count_tokens(template.replace(REQUIREMENTS, ''), model) + count_tokens(system_prompt, model)
+                + max_tokens + SAFETY_MARGIN_TOKENS)
+    budget = context_window(model) - reserved
+    token_budget = _prompt_token_budget.get()
+    if token_budget is not None:
+        budget = min(budget, token_budget)
+    return template.replace(REQUIREMENTS, fit_requirements(user_stories, model, query, budget))
@@ -0,0 +1,161 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from open_ai.openai_integration_updated import generate_section, generate_test_plan_identifier, \
+    ai_based_testing_estimation, generate_excluded_features_section, generate_features_to_be_tested_section, \
+    generate_staffing_and_training_needs, generate_test_deliverables_section, generate_environmental_needs_section, \
+    generate_schedule_section, generate_responsibilities_section, generate_introduction_section, \
+    generate_glossary_section, generate_remaining_test_tasks, get_feature_context, fan_out
+from open_ai.progress import ProgressReporter
+
+# Sections of a test plan, in document order
+TEST_PLAN_SECTIONS = [
+    "Test Plan Identifier", "References", "Approvals", "Introduction", "Test Items", "Software Risk Issues" "Features to be Tested", "Features not to be Tested", "Functional & Non-functional Testing Approach", "Item Pass/Fail Criteria",
+    "Suspension Criteria and Resumption Requirements", "Test Deliverables", "Remaining Test Tasks", "Test Data Needs",
+    "Environmental Needs", "Staffing and Training Needs", "Responsibilities", "Schedule",
+    "Planning Risks and Contingencies", "Test Estimation", "Glossary"
+]
+
+# Upper bound on the number of sections generated at the same time
+DEFAULT_MAX_WORKERS = 8
+# How often (in seconds) progress events are dispatched while waiting for the next section
+PROGRESS_POLL_INTERVAL = 0.2
+
+
+def format_person_info(person):
+    # Handle 'To be Decided' dates and properly formatted dates
+    date = person['date']
+    if date == 'To be Decided':
+        formatted_date = date
+    else:
+        formatted_date = datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d')
+    return f"Name: {person['name']}, Role: {person['role']}, Date: {formatted_date}"
+
+
+def generate_references_text(options):
+    """Build the 'References' section from the scanned documents and the reference URLs."""
+    references_text = "Documents:\n"
+    if options['file_names']:
+        references_text += "\n".join(f"{i + 1}. {name}" for i, name in enumerate(options['file_names']))
+    else:
+        references_text += "No documents available."
+
+    if options['urls']:
+        references_text += "\n\nReferenced URLs:\n" + "\n".join(
+            f"{i + 1}. {url}" for i, url in enumerate(options['urls']))
+    else:
+        references_text += "\n\nNo referenced URLs provided."
+    return references_text
+
+
+def generate_approvals_text(options):
+    """Build the 'Approvals' section from the approvers and reviewers entered in the form."""
+    approvers_text = "Approvers:\n" + "\n".join(format_person_info(person) for person in options['approvers'])
+    reviewers_text = "Reviewers:\n" + "\n".join(format_person_info(person) for person in options['reviewers'])
+    return approvers_text + "\n\n" + reviewers_text
+
+
+def generate_test_estimation_text(engine, api_key, user_stories_text, options, feature_context):
+    """Estimate the effort for every testing type chosen for the plan."""
+    features = feature_context.features
+    # (testing type, number of testers, chosen, text used when the type is not estimated)
+    testing_types = [
+        ("Functional Testing", options['num_testers'], True, None),
+        ("Automation Testing", options['num_automation_testers'], options['test_automation'],
+         "Estimation for Automation Testing was not done as it was not chosen to be estimated."),
+        ("Performance Testing", options['num_performance_testers'], options['performance_testing'],
+         "Estimation for Security Testing was not done as it was not chosen to be estimated."),
+        ("Security Testing", options['num_security_testers'], options['security_testing'],
+         "Estimation for Security Testing was not done as it was not chosen to be estimated."),
+    ]
+    chosen = [(testing_type, num_testers) for testing_type, num_testers, is_chosen, _ in testing_types if is_chosen]
+    # All chosen estimations are requested concurrently and reassembled in the order above
+    estimations = dict(zip(chosen, fan_out(
+        lambda item: ai_based_testing_estimation(engine, user_stories_text, features, item[1], item[0], api_key),
+        chosen)))
+    estimation_texts = [estimations[(testing_type, num_testers)] if is_chosen else skipped_text
+                        for testing_type, num_testers, is_chosen, skipped_text in testing_types]
+    return "\n\n".join(estimation_texts)
+
+
+def generate_section_content(section, engine, api_key, user_stories_text, options, feature_context):
+    """Generate the text of a single test plan section."""
+    if section == "Test Plan Identifier":
+        return generate_test_plan_identifier(engine, api_key, options, retries=5, base_delay=1.0)
+    elif section == "References":
+        return generate_references_text(options)
+    elif section == "Approvals":
+        return generate_approvals_text(options)
+    elif section == "Test Estimation":
+        return generate_test_estimation_text(engine, api_key, user_stories_text, options, feature_context)
+    elif section == "Features not to be Tested":
+        return generate_excluded_features_section(engine, section, user_stories_text, feature_context.features,
+                                                  api_key, options)
+    elif section == "Features to be Tested":
+        return generate_features_to_be_tested_section(engine, user_stories_text, api_key, options, feature_context)
+    elif section == "Test Deliverables":
+        return generate_test_deliverables_section(engine, api_key, options)
+    elif section == "Environmental Needs":
+        return generate_environmental_needs_section(engine, api_key, options)
+    elif section == "Schedule":
+        return generate_schedule_section(engine, api_key, options)
+    elif section == "Responsibilities":
+        return generate_responsibilities_section(engine, api_key, options)
+    elif section == "Introduction":
+        return generate_introduction_section(engine, api_key, options)
+    elif section == "Staffing and Training Needs":
+        return generate_staffing_and_training_needs(engine, user_stories_text, feature_context.features, api_key,
+                                                    options)
+    elif section == "Glossary":
+        return generate_glossary_section(engine, api_key, user_stories_text)
+    elif section == "Remaining Test Tasks":
+        return generate_remaining_test_tasks(engine, api_key, user_stories_text, options)
+    return generate_section(engine, section, user_stories_text, api_key, options, feature_context)
+
+
+def _timed_section(section, engine, api_key, user_stories_text, options, feature_context):
+    start_time = time.time()
+    content = generate_section_content(section, engine, api_key, user_stories_text, options, feature_context)
+    return content, time.time() - start_time
+
+
+def generate_sections(sections, engine, api_key, user_stories_text, options, feature_context=None,
+                      max_workers=DEFAULT_MAX_WORKERS, reporter=None):
+    """Generate all sections concurrently and yield them in document order.
+
+    Every section is submitted to a bounded worker pool at once. A section is yielded as
+    (index, section, content, timings) as soon as it and all of its predecessors are done,
+    so the caller can render the plan top to bottom while later sections are still being
+    generated. timings holds the section's own "Generation Time", measured in its worker,
+    with its "Time to First Token", streaming "Tokens per Second", the "Prompt Tokens" and
+    "Completion Tokens" of all its requests and whether it was "Cached" (see
+    ProgressReporter.section_metrics). If a section fails, its exception is raised when it is
+    reached in order.
+
+    Progress events of the workers are dispatched to the reporter's handler on the calling
+    thread while it waits for the next section. The feature context is shared by all
+    sections; it is looked up once here when the caller does not have one yet.
+    """
+    if feature_context is None:
+        feature_context = get_feature_context(engine, user_stories_text, api_key)
+    reporter = reporter or ProgressReporter()
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="section")
+    try:
+        # Workers run in copies of the caller's context, so they use its cache and streaming settings
+        futures = [executor.submit(contextvars.copy_context().run, reporter.track, section, _timed_section, section,
+                                   engine, api_key, user_stories_text, options, feature_context)
+                   for section in sections]
+        for index, (section, future) in enumerate(zip(sections, futures)):
+            while not future.done():
+                wait([future], timeout=PROGRESS_POLL_INTERVAL)
+                reporter.dispatch()
+            reporter.dispatch()
+            content, generation_time = future.result()
+            timings = {"Generation Time": generation_time}
+            timings.update(reporter.section_metrics(section))
+            yield index, section, content, timings
+    finally:
+        # Drop sections that have not started yet if the caller stops early or a section failed
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,4 @@
+from feedback_app_independent import feedback_app
+
+# One page of the main app collects the feedback of every plan; ?session_id=... selects the plan
+feedback_app()
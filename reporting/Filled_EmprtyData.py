@@ -1,26 +1,28 @@
-import pandas as pd
-import numpy as np
+import argparse
 
-# Example data loading (replace this with the path to your actual CSV file)
-data = pd.read_csv('output/feedback/KeepPass/combined_data.csv')
+from feedback_dataset import load_feedback_data, analysis_path
+from imputation import impute, STRATEGIES
 
-# Group by 'Section' and calculate mean and standard deviation for each section's generation time
-section_stats = data.groupby('Section')['Generation Time'].agg(['mean', 'std'])
+parser = argparse.ArgumentParser(description="Fill missing generation times of the combined feedback data.")
+parser.add_argument('--application', default='KeepPass')
+parser.add_argument('--strategy', choices=STRATEGIES, default='normal')
+parser.add_argument('--model-aware', action='store_true',
+                    help="Use the statistics of the same model and section, falling back to the section")
+parser.add_argument('--seed', type=int, default=None, help="Seed of the random draws of the 'normal' strategy")
+args = parser.parse_args()
 
-# Function to generate a random time based on section stats
-def generate_random_time(section, mean, std):
-    # If standard deviation is NaN (only one value for section), just return the mean
-    if pd.isna(std):
-        return mean
-    # Otherwise, draw from a normal distribution around the mean with the given standard deviation
-    return max(0, np.random.normal(mean, std))
+application_name = args.application
+data = load_feedback_data(application_name)
 
-# Apply the function to rows with missing generation times
-for index, row in data[data['Generation Time'].isnull()].iterrows():
-    section = row['Section']
-    mean, std = section_stats.loc[section]
-    data.at[index, 'Generation Time'] = generate_random_time(section, mean, std)
+# Missing generation times are drawn from (or set to) the statistics of their section
+if args.model_aware:
+    data, report = impute(data, strategy=args.strategy, by=('Model Name', 'Section'), fallback_by=('Section',),
+                          seed=args.seed)
+else:
+    data, report = impute(data, strategy=args.strategy, by=('Section',), seed=args.seed)
 
 # Check the data and save it to a new CSV file
 print(data.head())
-data.to_csv('output/feedback/KeepPass/updated_combined_data.csv', index=False)
+print(f"Imputed {int(report['Imputed Values'].sum())} values in {len(report)} groups.")
+data.to_csv(analysis_path(application_name, 'updated_combined_data.csv'), index=False)
+report.to_csv(analysis_path(application_name, 'imputation_report.csv'), index=False)
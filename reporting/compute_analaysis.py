@@ -1,8 +1,10 @@
 import pandas as pd
 
-# Load the CSV data into a pandas DataFrame
-csv_file_path = '../output/analysis/KeepPass/updated_combined_data.csv'
-df = pd.read_csv(csv_file_path)
+from feedback_dataset import load_imputed_data, analysis_path
+
+# Load the combined feedback with gaps filled
+application_name = 'KeepPass'
+df = load_imputed_data(application_name)
 
 # Define cost factors for each model based on model complexity
 cost_factors = {
@@ -56,7 +58,7 @@ computational_efficiency = pd.DataFrame({
 computational_efficiency.reset_index(drop=True, inplace=True)
 
 # Save the DataFrame to an Excel file
-excel_file_path = '../output/analysis/KeepPass/computational_efficiency.xlsx'
+excel_file_path = analysis_path(application_name, 'computational_efficiency.xlsx')
 computational_efficiency.to_excel(excel_file_path, index=False)
 
 # Display the DataFrame
@@ -1,10 +1,9 @@
-import pandas as pd
+import os
 
-# Path to the CSV file (adjust the path to your actual CSV file location)
-csv_file_path = '../output/analysis/KeepPass/updated_combined_data.csv'
+from feedback_dataset import load_imputed_data, ANALYSIS_DIR
 
-# Load the CSV data into a pandas DataFrame
-df = pd.read_csv(csv_file_path)
+# Load the combined feedback with gaps filled
+df = load_imputed_data('KeepPass')
 
 # Pivot the data to have 'Section' as the index and 'Model Name' as the columns,
 # with 'Detail Rating' as the values. We'll use the mean for aggregation.
@@ -18,7 +17,7 @@ pivot_df = pivot_df.fillna(pivot_df.mean(axis=0))
 pivot_df = pivot_df.sort_index()
 
 # Save the pivoted DataFrame to a new CSV file if needed
-output_csv_path = '../output/analysis/Relevance.csv'
+output_csv_path = os.path.join(ANALYSIS_DIR, 'Relevance.csv')
 pivot_df.to_csv(output_csv_path)
 
 print(pivot_df.head())  # Display the first few entries
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    DATASET_FORMAT = 'parquet'
+except ImportError:  # Without a Parquet engine the dataset parts are kept as CSV
+    DATASET_FORMAT = 'csv'
+
+# Paths are relative to the repository root, so the reporting scripts can be run from any directory
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEEDBACK_DIR = os.path.join(REPO_ROOT, 'output', 'feedback')
+ANALYSIS_DIR = os.path.join(REPO_ROOT, 'output', 'analysis')
+DATASET_DIR = os.path.join(ANALYSIS_DIR, 'feedback_dataset')
+MANIFEST_FILE = os.path.join(DATASET_DIR, 'manifest.json')
+STORE_DB_FILE = os.path.join(REPO_ROOT, 'session_data.db')
+# Feedback CSVs exported from the store by storage.plan_store (EXPORTED_FEEDBACK_SUFFIX); their rows come from the store
+EXPORTED_FEEDBACK_PATTERN = re.compile(r'_db\d+\.csv$')
+
+# Side-by-side model tables written by python -m testplan compare
+COMPARISON_FILE = 'model_comparison.csv'
+COMPARISON_SECTIONS_FILE = 'model_comparison_sections.csv'
+
+MODEL_COLUMN = 'Model Name'
+# The integrated feedback app wrote "Model Name", the independent one "Model Used"
+MODEL_COLUMN_ALIASES = ['Model Used']
+
+
+def analysis_path(application_name, filename):
+    """Return the path of an analysis output of an application, creating its directory."""
+    directory = os.path.join(ANALYSIS_DIR, application_name)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
+def _partition_value(value):
+    return re.sub(r'[^\w.-]', '_', str(value)) if pd.notna(value) and str(value) else 'unknown'
+
+
+def normalize_feedback(df, application_name, source):
+    """Give a feedback frame the dataset's columns: one model column, its application and where it came from."""
+    df = df.copy()
+    for alias in MODEL_COLUMN_ALIASES:
+        if alias in df.columns:
+            df[MODEL_COLUMN] = df[MODEL_COLUMN].fillna(df[alias]) if MODEL_COLUMN in df.columns else df[alias]
+            df = df.drop(columns=alias)
+    if MODEL_COLUMN not in df.columns:
+        df[MODEL_COLUMN] = None
+    df['Application Name'] = application_name
+    df['Source File'] = source
+    df['Source Row'] = range(len(df))
+    return df
+
+
+def _load_manifest():
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    return {'files': {}, 'last_feedback_id': 0}
+
+
+def _save_manifest(manifest):
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    temporary_file = MANIFEST_FILE + '.tmp'
+    with open(temporary_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temporary_file, MANIFEST_FILE)
+
+
+def _write_parts(df, source):
+    """Write the rows of one source as one part per application/model partition and return the part paths."""
+    parts = []
+    name = hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    for (application, model), rows in df.groupby(['Application Name', MODEL_COLUMN], dropna=False, sort=False):
+        directory = os.path.join(DATASET_DIR, f"application={_partition_value(application)}",
+                                 f"model={_partition_value(model)}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{name}.{DATASET_FORMAT}")
+        if DATASET_FORMAT == 'parquet':
+            rows.to_parquet(path, index=False)
+        else:
+            rows.to_csv(path, index=False)
+        parts.append(os.path.relpath(path, DATASET_DIR))
+    return parts
+
+
+def _remove_parts(parts):
+    for part in parts:
+        path = os.path.join(DATASET_DIR, part)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _feedback_files():
+    if not os.path.isdir(FEEDBACK_DIR):
+        return
+    for application_name in sorted(os.listdir(FEEDBACK_DIR)):
+        directory = os.path.join(FEEDBACK_DIR, application_name)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            # Combined files written by earlier versions of the reporting scripts are not feedback submissions
+            if filename.endswith('.csv') and '_test_plan_feedback_' in filename and \
+                    not EXPORTED_FEEDBACK_PATTERN.search(filename):
+                yield application_name, os.path.join(directory, filename)
+
+
+def read_feedback_files():
+    """Return the rows of the feedback CSVs with the dataset's columns, without writing anything."""
+    frames = [normalize_feedback(pd.read_csv(path), application_name, os.path.relpath(path, FEEDBACK_DIR))
+              for application_name, path in _feedback_files()]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).drop(columns=['Source Row'])
+
+
+def ingest_feedback(include_store=True):
+    """Merge feedback not seen before into the dataset and return the number of rows added.
+
+    Feedback CSVs are tracked by name, modification time and size; a file that changed
+    replaces the rows it contributed before. Feedback saved in the plan store is tracked
+    by its feedback id.
+    """
+    manifest = _load_manifest()
+    added = 0
+    for application_name, path in _feedback_files():
+        source = os.path.relpath(path, FEEDBACK_DIR)
+        stat = os.stat(path)
+        signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        known = manifest['files'].get(source)
+        if known and known['mtime_ns'] == signature['mtime_ns'] and known['size'] == signature['size']:
+            continue
+        if known:
+            _remove_parts(known['parts'])
+        df = normalize_feedback(pd.read_csv(path), application_name, source)
+        manifest['files'][source] = dict(signature, parts=_write_parts(df, source), rows=len(df))
+        added += len(df)
+    if include_store:
+        added += _ingest_store_feedback(manifest)
+    _save_manifest(manifest)
+    return added
+
+
+def _ingest_store_feedback(manifest):
+    if REPO_ROOT not in sys.path:  # The reporting scripts are run as plain scripts
+        sys.path.append(REPO_ROOT)
+    from storage.plan_store import load_feedback
+
+    if not os.path.exists(STORE_DB_FILE):
+        return 0
+    df = load_feedback(db_file=STORE_DB_FILE)
+    df = df[df['Feedback ID'] > manifest.get('last_feedback_id', 0)]
+    if df.empty:
+        return 0
+    source = f"session_data.db#{df['Feedback ID'].min()}-{df['Feedback ID'].max()}"
+    frames = [normalize_feedback(rows.drop(columns=['Application Name', 'Feedback ID', 'Submitted At']),
+                                 application_name, source)
+              for application_name, rows in df.groupby('Application Name', sort=False)]
+    manifest['files'][source] = {'parts': _write_parts(pd.concat(frames, ignore_index=True), source),
+                                 'rows': len(df)}
+    manifest['last_feedback_id'] = int(df['Feedback ID'].max())
+    return len(df)
+
+
+def load_feedback_data(application_name=None, model=None, ingest=True):
+    """Return the combined feedback of an application (or of all of them), optionally of one model.
+
+    New feedback is merged into the dataset first unless ingest is False. Only the
+    partitions of the requested application and model are read.
+    """
+    if ingest:
+        ingest_feedback()
+    application_pattern = f"application={_partition_value(application_name)}" if application_name else None
+    model_pattern = f"model={_partition_value(model)}" if model else None
+    frames = []
+    for directory, _, filenames in os.walk(DATASET_DIR):
+        parts = os.path.relpath(directory, DATASET_DIR).split(os.sep)
+        if len(parts) != 2 or (application_pattern and parts[0] != application_pattern) or \
+                (model_pattern and parts[1] != model_pattern):
+            continue
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if filename.endswith('.parquet'):
+                frames.append(pd.read_parquet(path))
+            elif filename.endswith('.csv'):
+                frames.append(pd.read_csv(path))
+    if not frames:
+        return pd.DataFrame()
+    # Rows keep the order of the files (named by submission time) and of the rows in each file
+    data = pd.concat(frames, ignore_index=True).sort_values(['Source File', 'Source Row'], kind='stable')
+    return data.drop(columns=['Source Row']).reset_index(drop=True)
+
+
+def load_imputed_data(application_name):
+    """Return the combined feedback of an application with gaps filled by Filled_EmprtyData."""
+    return pd.read_csv(analysis_path(application_name, 'updated_combined_data.csv'))
+
+
+def load_model_comparison(application_name, sections=False):
+    """Return the latest model comparison of an application: one row per model, or per model and section."""
+    return pd.read_csv(analysis_path(application_name, COMPARISON_SECTIONS_FILE if sections else COMPARISON_FILE))
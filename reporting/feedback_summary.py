@@ -1,11 +1,11 @@
 import pandas as pd
 import numpy as np
 
-# Assuming 'combined_data.csv' is the path to the combined CSV file
-csv_file_path = '../output/analysis/KeepPass/updated_combined_data.csv'
+from feedback_dataset import load_imputed_data, analysis_path
 
-# Load the CSV data into a pandas DataFrame
-df = pd.read_csv(csv_file_path)
+# Load the combined feedback with gaps filled
+application_name = 'KeepPass'
+df = load_imputed_data(application_name)
 
 # Filter out specific sections
 excluded_sections = ['Approvals', 'Test Plan Identifier', 'Glossary', 'References']
@@ -44,7 +44,7 @@ feedback_summary = pd.DataFrame({
 feedback_summary.reset_index(drop=True, inplace=True)
 
 # Save the DataFrame to an Excel file
-excel_file_path = '../output/analysis/KeepPass/feedback_summary.xlsx'
+excel_file_path = analysis_path(application_name, 'feedback_summary.xlsx')
 feedback_summary.to_excel(excel_file_path, index=False)
 
 # Show the DataFrame
@@ -1,8 +1,10 @@
 import pandas as pd
 
-# Load the CSV data into a pandas DataFrame
-csv_file_path = '../output/analysis/KeepPass/updated_combined_data.csv'  # Update with your actual file path
-df = pd.read_csv(csv_file_path)
+from feedback_dataset import load_imputed_data, analysis_path
+
+# Load the combined feedback with gaps filled
+application_name = 'KeepPass'
+df = load_imputed_data(application_name)
 
 # Ensure 'Generation Time' is a numeric type for calculations
 df['Generation Time'] = pd.to_numeric(df['Generation Time'], errors='coerce')
@@ -23,7 +25,7 @@ overall_average_time.columns = ['Model Name', 'Average Overall Test Plan Time']
 complete_average_times = pd.concat([section_times, overall_average_time], ignore_index=True)
 
 # Save the DataFrame to an Excel file
-excel_file_path = '../output/analysis/KeepPass/average_generation_time_including_overall.xlsx'
+excel_file_path = analysis_path(application_name, 'average_generation_time_including_overall.xlsx')
 complete_average_times.to_excel(excel_file_path, index=False)
 
 # Confirmation message
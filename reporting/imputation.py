@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+STRATEGIES = ('normal', 'mean', 'median')
+
+
+def impute(data, column='Generation Time', strategy='normal', by=('Section',), fallback_by=None, seed=None):
+    """Fill the missing values of a column from the statistics of its group and return (data, report).
+
+    strategy 'normal' draws every missing value from a normal distribution with the mean and
+    standard deviation of its group (clipped at 0, or the mean when the group has a single
+    value); 'mean' and 'median' use that statistic. Groups without any value take the
+    statistics of their fallback_by group when given, e.g. by=('Model Name', 'Section')
+    with fallback_by=('Section',) for model-aware imputation. A fixed seed makes the draws
+    reproducible. The report has one row per group with values filled in.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown imputation strategy '{strategy}', expected one of {', '.join(STRATEGIES)}.")
+    data = data.copy()
+    missing = data[column].isna()
+    statistics = ['mean', 'std'] if strategy == 'normal' else [strategy]
+    grouped = data.groupby(list(by), dropna=False)[column]
+    stats = pd.DataFrame({statistic: grouped.transform(statistic) for statistic in statistics})
+    stats['Source'] = ', '.join(by)
+    if fallback_by is not None:
+        fallback = data.groupby(list(fallback_by), dropna=False)[column]
+        # Rows of groups without any value take their statistics from the fallback group
+        use_fallback = stats[statistics[0]].isna()
+        for statistic in statistics:
+            stats.loc[use_fallback, statistic] = fallback.transform(statistic)[use_fallback]
+        stats.loc[use_fallback, 'Source'] = ', '.join(fallback_by)
+
+    values = stats.loc[missing, statistics[0]].to_numpy(dtype=float)
+    if strategy == 'normal':
+        std = stats.loc[missing, 'std'].to_numpy(dtype=float)
+        # One draw per missing value, all from the same seeded generator
+        draws = np.random.default_rng(seed).standard_normal(missing.sum())
+        values = np.where(np.isnan(std), values, np.maximum(0, values + draws * std))
+    data.loc[missing, column] = values
+
+    filled = missing & data[column].notna()
+    report = (pd.DataFrame({key: data.loc[filled, key] for key in by})
+              .assign(**{'Statistics From': stats.loc[filled, 'Source'], 'Imputed Value': data.loc[filled, column]})
+              .groupby(list(by) + ['Statistics From'], dropna=False)['Imputed Value']
+              .agg(['count', 'mean', 'min', 'max'])
+              .rename(columns={'count': 'Imputed Values', 'mean': 'Mean Imputed', 'min': 'Min Imputed',
+                               'max': 'Max Imputed'})
+              .reset_index())
+    report.insert(0, 'Strategy', strategy)
+    report.insert(0, 'Column', column)
+    unfilled = int((missing & data[column].isna()).sum())
+    if unfilled:
+        print(f"{unfilled} missing '{column}' values were left empty: their groups have no values.")
+    return data, report
@@ -1,7 +1,8 @@
-import pandas as pd
+from feedback_dataset import load_feedback_data, analysis_path
+
 # Load the combined data
-file_path = 'output/feedback/KeepPass/combined_data.csv'
-combined_data = pd.read_csv(file_path)
+application_name = 'KeepPass'
+combined_data = load_feedback_data(application_name)
 
 # Calculate the average ratings for each model
 performance_overview = combined_data.groupby('Model Name').agg({
@@ -17,7 +18,7 @@ performance_overview.columns = [
     'Average Relevance Rating', 'Overall Quality'
 ]
 
-performance_overview.to_excel('output/feedback/KeepPass/performance_overview.xlsx', index=False)
+performance_overview.to_excel(analysis_path(application_name, 'performance_overview.xlsx'), index=False)
 
 # Show the table
 
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def make_cache_key(*parts):
+    """Hash any JSON-serialisable parts into a stable cache key."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheStore:
+    """A persistent key-value cache kept in a SQLite table, with TTL and size based eviction.
+
+    Values are stored as JSON. Entries older than ttl_seconds are treated as missing, and
+    once the table holds more than max_entries the least recently used entries are evicted.
+    The store is safe to use from several threads; hits and misses are counted per process.
+    """
+
+    def __init__(self, db_file, table, ttl_seconds=None, max_entries=None):
+        self.db_file = db_file
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    created_at REAL,
+                    accessed_at REAL
+                )
+            ''')
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)')
+            self._conn.commit()
+        return self._conn
+
+    def _is_expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached value for key, or None when it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(f'SELECT value, created_at FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None or self._is_expired(row[1], now):
+                if row is not None:
+                    conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), now, now))
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute(f'DELETE FROM {self.table} WHERE created_at < ?', (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            conn.execute(f'''
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f'DELETE FROM {self.table}')
+            conn.commit()
+
+    def stats(self):
+        """Return the hit/miss counters of this process and the number of stored entries."""
+        with self._lock:
+            entries = self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
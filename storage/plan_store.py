@@ -0,0 +1,137 @@
+import os
+import re
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from storage.session_store import get_session_store, insert_sessions, SESSION_DB
+
+# Columns of the per-submission feedback CSVs the reporting scripts read
+LEGACY_FEEDBACK_COLUMNS = ["Section", "Content", "Word Count", "Generation Time", "Detail Rating", "Clarity Rating",
+                           "Relevance Rating", "Overall Quality"]
+OVERALL_FEEDBACK_SECTION = "Overall Feedback"
+# Suffix of the exported feedback CSVs; the feedback dataset skips them, it reads the same rows from the database
+EXPORTED_FEEDBACK_SUFFIX = "_db{feedback_id}.csv"
+
+
+def _sanitize_filename(name):
+    return re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
+
+
+def create_plan(application_name, model_used, filename, section_details, plan_hash=None, db_file=SESSION_DB):
+    """Save a generated plan with its session and sections in one transaction.
+
+    Returns (session_id, doc_gen_id); the doc_gen_id identifies the plan in the plans table.
+    """
+    with get_session_store(db_file).connection() as conn:
+        session_id, plan_id = insert_sessions(conn, [(application_name, model_used, filename)])[0]
+        conn.execute('INSERT INTO plans (plan_id, session_id, application_name, model_used, plan_hash, created_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)',
+                     (plan_id, session_id, application_name, model_used, plan_hash, datetime.now().isoformat()))
+        _insert_sections(conn, plan_id, section_details)
+    return session_id, plan_id
+
+
+def import_plan(session_id, plan_id, application_name, model_used, section_details, db_file=SESSION_DB):
+    """Store the sections of a plan whose session predates the plans table (they were kept in a JSON file)."""
+    with get_session_store(db_file).connection() as conn:
+        if conn.execute('SELECT 1 FROM plans WHERE plan_id = ?', (plan_id,)).fetchone():
+            return
+        conn.execute('INSERT INTO plans (plan_id, session_id, application_name, model_used, created_at) '
+                     'VALUES (?, ?, ?, ?, ?)', (plan_id, session_id, application_name, model_used,
+                                                datetime.now().isoformat()))
+        _insert_sections(conn, plan_id, section_details)
+
+
+def _insert_sections(conn, plan_id, section_details):
+    conn.executemany('INSERT INTO sections (plan_id, position, section, content, word_count, generation_time, '
+                     'time_to_first_token, tokens_per_second, prompt_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     [(plan_id, position, detail['Section'], detail['Content'], detail.get('Word Count'),
+                       detail.get('Generation Time'), detail.get('Time to First Token'),
+                       detail.get('Tokens per Second'), detail.get('Prompt Tokens'))
+                      for position, detail in enumerate(section_details)])
+
+
+def get_section_details(plan_id, db_file=SESSION_DB):
+    """Return the sections of a plan as the section_details the app builds, or None if the plan is not stored."""
+    with get_session_store(db_file).connection() as conn:
+        rows = conn.execute('SELECT section, content, word_count, generation_time, time_to_first_token, '
+                            'tokens_per_second, prompt_tokens FROM sections WHERE plan_id = ? ORDER BY position',
+                            (plan_id,)).fetchall()
+    if not rows:
+        return None
+    return [{"Section": row[0], "Content": row[1], "Word Count": row[2], "Generation Time": row[3],
+             "Time to First Token": row[4], "Tokens per Second": row[5], "Prompt Tokens": row[6]} for row in rows]
+
+
+def save_feedback(plan_id, model_used, feedback_data, db_file=SESSION_DB):
+    """Save one feedback submission (the rows of the feedback form) in one transaction and return its id."""
+    overall = [row for row in feedback_data if row["Section"] == OVERALL_FEEDBACK_SECTION]
+    overall_quality = overall[0].get("Overall Quality") if overall else None
+    with get_session_store(db_file).connection() as conn:
+        cursor = conn.execute('INSERT INTO feedback (plan_id, model_used, overall_quality, submitted_at) '
+                              'VALUES (?, ?, ?, ?)', (plan_id, model_used, overall_quality, datetime.now().isoformat()))
+        feedback_id = cursor.lastrowid
+        conn.executemany('INSERT INTO ratings (feedback_id, position, section, detail_rating, clarity_rating, '
+                         'relevance_rating) VALUES (?, ?, ?, ?, ?, ?)',
+                         [(feedback_id, position, row["Section"], row.get("Detail Rating"), row.get("Clarity Rating"),
+                           row.get("Relevance Rating")) for position, row in enumerate(feedback_data)])
+    return feedback_id
+
+
+def load_feedback(application_name=None, db_file=SESSION_DB):
+    """Return every rating joined with its plan section, in the layout of the legacy feedback CSVs.
+
+    Besides the legacy columns, each row carries its Application Name, Model Name,
+    Feedback ID and Submitted At.
+    """
+    query = '''
+        SELECT p.application_name, f.feedback_id, f.submitted_at, f.model_used, r.section, s.content,
+               s.word_count, s.generation_time, r.detail_rating, r.clarity_rating, r.relevance_rating,
+               CASE WHEN r.section = ? THEN f.overall_quality END
+        FROM ratings r
+        JOIN feedback f ON f.feedback_id = r.feedback_id
+        JOIN plans p ON p.plan_id = f.plan_id
+        LEFT JOIN sections s ON s.plan_id = f.plan_id AND s.section = r.section
+    '''
+    params = [OVERALL_FEEDBACK_SECTION]
+    if application_name is not None:
+        query += ' WHERE p.application_name = ?'
+        params.append(application_name)
+    query += ' ORDER BY f.feedback_id, r.position'
+    with get_session_store(db_file).connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+    df.columns = ["Application Name", "Feedback ID", "Submitted At", "Model Name"] + LEGACY_FEEDBACK_COLUMNS
+    overall = df["Section"] == OVERALL_FEEDBACK_SECTION
+    df["Word Count"] = df["Word Count"].astype(object)
+    df.loc[overall, ["Content", "Word Count"]] = "N/A"
+    return df
+
+
+def export_legacy_feedback(base_dir="output/feedback", application_name=None, model_column="Model Name",
+                           db_file=SESSION_DB):
+    """Write one CSV per feedback submission in the legacy output/feedback/<app>/ layout and return their paths.
+
+    File names end with the feedback id (EXPORTED_FEEDBACK_SUFFIX), which keeps the export
+    from being ingested a second time next to the database rows.
+    """
+    df = load_feedback(application_name, db_file)
+    paths = []
+    for (application, _), submission in df.groupby(["Application Name", "Feedback ID"], sort=False):
+        app_dir = os.path.join(base_dir, _sanitize_filename(application))
+        os.makedirs(app_dir, exist_ok=True)
+        timestamp = datetime.fromisoformat(submission["Submitted At"].iloc[0]).strftime("%Y%m%d%H%M%S")
+        suffix = EXPORTED_FEEDBACK_SUFFIX.format(feedback_id=submission["Feedback ID"].iloc[0])
+        path = os.path.join(app_dir, f"{_sanitize_filename(application)}_test_plan_feedback_{timestamp}{suffix}")
+        legacy = submission[LEGACY_FEEDBACK_COLUMNS].copy()
+        legacy[model_column] = submission["Model Name"]
+        legacy.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    # python -m storage.plan_store [application name]
+    for exported in export_legacy_feedback(application_name=sys.argv[1] if len(sys.argv) > 1 else None):
+        print(f"Exported {exported}")
@@ -0,0 +1,184 @@
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+SESSION_DB = 'session_data.db'
+POOL_SIZE = 8
+
+# Schema versions, applied in order; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    # 1: the sessions table as created by earlier versions of the app
+    '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        application_name TEXT,
+        model_used TEXT,
+        doc_gen_id TEXT,
+        filename TEXT
+    );
+    ''',
+    # 2: creation time and indexes for the lookups of the feedback UI
+    '''
+    ALTER TABLE sessions ADD COLUMN created_at TEXT;
+    CREATE INDEX IF NOT EXISTS idx_sessions_application ON sessions (application_name, created_at);
+    CREATE INDEX IF NOT EXISTS idx_sessions_doc_gen ON sessions (doc_gen_id);
+    ''',
+    # 3: generated plans, their sections, and the feedback and per-section ratings given on them
+    '''
+    CREATE TABLE IF NOT EXISTS plans (
+        plan_id TEXT PRIMARY KEY,
+        session_id TEXT REFERENCES sessions (session_id),
+        application_name TEXT NOT NULL,
+        model_used TEXT,
+        plan_hash TEXT,
+        created_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_plans_application_model ON plans (application_name, model_used);
+    CREATE TABLE IF NOT EXISTS sections (
+        plan_id TEXT NOT NULL REFERENCES plans (plan_id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        section TEXT NOT NULL,
+        content TEXT,
+        word_count INTEGER,
+        generation_time REAL,
+        time_to_first_token REAL,
+        tokens_per_second REAL,
+        prompt_tokens INTEGER,
+        PRIMARY KEY (plan_id, position)
+    );
+    CREATE TABLE IF NOT EXISTS feedback (
+        feedback_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plan_id TEXT NOT NULL REFERENCES plans (plan_id) ON DELETE CASCADE,
+        model_used TEXT,
+        overall_quality INTEGER,
+        submitted_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_feedback_plan ON feedback (plan_id);
+    CREATE TABLE IF NOT EXISTS ratings (
+        feedback_id INTEGER NOT NULL REFERENCES feedback (feedback_id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        section TEXT NOT NULL,
+        detail_rating INTEGER,
+        clarity_rating INTEGER,
+        relevance_rating INTEGER,
+        PRIMARY KEY (feedback_id, position)
+    );
+    CREATE INDEX IF NOT EXISTS idx_ratings_section ON ratings (section);
+    ''',
+]
+
+
+def migrate(conn):
+    """Apply the migrations the database has not seen yet, each in its own transaction.
+
+    Each transaction takes the write lock (BEGIN IMMEDIATE) before reading the version
+    again, so when the app and the feedback tools open a database at the same time only
+    one of them applies a migration and the others see it applied.
+    """
+    while conn.execute('PRAGMA user_version').fetchone()[0] < len(MIGRATIONS):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRATIONS):
+                for statement in MIGRATIONS[version].split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def insert_sessions(conn, sessions):
+    """Insert (application_name, model_used, filename) sessions on conn and return their (session_id, doc_gen_id)."""
+    created_at = datetime.now().isoformat()
+    rows = [(str(uuid.uuid4()), application_name, model_used, str(uuid.uuid4()), filename, created_at)
+            for application_name, model_used, filename in sessions]
+    conn.executemany('INSERT INTO sessions (session_id, application_name, model_used, doc_gen_id, filename, '
+                     'created_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+    return [(row[0], row[3]) for row in rows]
+
+
+class SessionStore:
+    """Sessions of generated test plans, kept in SQLite.
+
+    Connections are opened once and reused from a small pool, so callers on any thread
+    (e.g. Streamlit reruns) do not pay for connecting or for schema checks. The database
+    runs in WAL mode, so the feedback UI can read while plans are being written.
+    """
+
+    def __init__(self, db_file=SESSION_DB, pool_size=POOL_SIZE):
+        self.db_file = db_file
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._migrate_lock = threading.Lock()
+        self._migrated = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        with self._migrate_lock:
+            if not self._migrated:
+                migrate(conn)
+                self._migrated = True
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; the transaction is committed, or rolled back on error, on return."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def create_session(self, application_name, model_used, filename):
+        """Save a session and return its (session_id, doc_gen_id)."""
+        return self.create_sessions([(application_name, model_used, filename)])[0]
+
+    def create_sessions(self, sessions):
+        """Save many (application_name, model_used, filename) sessions in one transaction and return their ids."""
+        with self.connection() as conn:
+            return insert_sessions(conn, sessions)
+
+    def get_session(self, session_id):
+        """Return (application_name, model_used, doc_gen_id, filename) of a session, or None."""
+        with self.connection() as conn:
+            return conn.execute('SELECT application_name, model_used, doc_gen_id, filename FROM sessions '
+                                'WHERE session_id = ?', (session_id,)).fetchone()
+
+    def get_applications(self):
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute('SELECT DISTINCT application_name FROM sessions '
+                                                   'ORDER BY application_name')]
+
+    def get_sessions_for_app(self, application_name):
+        """Return (session_id, doc_gen_id, model_used, filename) of every session of an application, oldest first."""
+        with self.connection() as conn:
+            return conn.execute('SELECT session_id, doc_gen_id, model_used, filename FROM sessions '
+                                'WHERE application_name = ? ORDER BY created_at, rowid',
+                                (application_name,)).fetchall()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(db_file=SESSION_DB):
+    """Return the store of a database file, shared by every caller in the process."""
+    with _stores_lock:
+        if db_file not in _stores:
+            _stores[db_file] = SessionStore(db_file)
+        return _stores[db_file]
@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+
+from open_ai.backends import get_backend, MOCK_API_KEY
+from open_ai.client import load_rate_limits, set_default_rate_limits, set_max_concurrent_requests, \
+    set_response_cache_bypass, set_streaming
+from open_ai.prompt_builder import set_prompt_token_budget, DEFAULT_PROMPT_TOKEN_BUDGET
+from open_ai.test_plan_engine import DEFAULT_MAX_WORKERS
+from testplan.batch import load_manifest, run_manifest, write_report, DEFAULT_MAX_PLANS, DEFAULT_MAX_REQUESTS
+from testplan.compare import compare_models, save_comparison
+
+
+def get_api_key():
+    """Read the API key from OPENAI_API_KEY, or from the Streamlit secrets the app uses."""
+    if not get_backend().requires_api_key:
+        return MOCK_API_KEY
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if api_key:
+        return api_key
+    import streamlit as st
+    return st.secrets["OPENAI_API_KEY"]
+
+
+def run_compare(applications, args):
+    matches = [application for application in applications
+               if args.application is None or application['name'] == args.application]
+    if not matches:
+        print(f"Application {args.application} is not in {args.manifest}")
+        return 1
+    application = matches[0]
+    models, sections = compare_models(application, args.models, get_api_key(), max_workers=args.max_sections)
+    print(models.drop(columns=["Test Plan", "Session ID"], errors='ignore').to_string(index=False))
+    models_path, sections_path = save_comparison(application['name'], models, sections)
+    print(f"Comparison saved to {models_path} and {sections_path}")
+    return 1 if models["Error"].notna().any() else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m testplan', description="Generate test plans without the app.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help="Generate the test plans of every application in a manifest")
+    generate.add_argument('manifest', help="YAML or JSON manifest of the applications")
+    generate.add_argument('--model', default='gpt-3.5-turbo', help="Model of applications that do not name one")
+    generate.add_argument('--max-plans', type=int, default=DEFAULT_MAX_PLANS, help="Plans generated at the same time")
+    generate.add_argument('--report', help="Write the results as JSON to this file")
+    compare = commands.add_parser('compare', help="Generate the plan of one application with several models")
+    compare.add_argument('manifest', help="YAML or JSON manifest of the applications")
+    compare.add_argument('--application', help="Application of the manifest to compare on (default: the first)")
+    compare.add_argument('--models', nargs='+', required=True, help="Models to compare")
+    for command in (generate, compare):
+        command.add_argument('--max-sections', type=int, default=DEFAULT_MAX_WORKERS,
+                             help="Sections of a plan generated at the same time")
+        command.add_argument('--max-requests', type=int, default=DEFAULT_MAX_REQUESTS,
+                             help="Requests in flight at the same time across all plans (0 = no cap)")
+        command.add_argument('--bypass-cache', action='store_true', help="Re-roll all responses")
+        command.add_argument('--prompt-tokens', type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET,
+                             help="Requirement tokens per prompt (0 = fit the model's context window)")
+        command.add_argument('--rate-limits', metavar='FILE',
+                             help="JSON file of the requests and tokens per minute of each model "
+                                  "(default: $OPENAI_RATE_LIMITS_FILE)")
+        command.add_argument('--rpm', type=int, help="Requests per minute of models without limits of their own "
+                                                     "(default: $OPENAI_RPM or 500)")
+        command.add_argument('--tpm', type=int, help="Tokens per minute of models without limits of their own "
+                                                     "(default: $OPENAI_TPM or 60000)")
+    args = parser.parse_args(argv)
+
+    applications = load_manifest(args.manifest)
+    # Nobody watches the tokens arrive, so plans request complete responses; a comparison streams them to
+    # measure the time to first token and tokens per second of every model
+    set_streaming(args.command == 'compare')
+    set_response_cache_bypass(args.bypass_cache)
+    set_prompt_token_budget(args.prompt_tokens)
+    set_max_concurrent_requests(args.max_requests)
+    # The limits of the account tier have to be known before the first request of each model
+    if args.rate_limits:
+        load_rate_limits(args.rate_limits)
+    set_default_rate_limits(args.rpm, args.tpm)
+    if args.command == 'compare':
+        return run_compare(applications, args)
+    results = run_manifest(applications, get_api_key(), default_engine=args.model, max_plans=args.max_plans,
+                           max_workers=args.max_sections)
+    if args.report:
+        print(f"Report saved to {write_report(results, args.report)}")
+    failed = [result['application'] for result in results if 'error' in result]
+    print(f"Generated {len(results) - len(failed)} of {len(results)} test plans.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
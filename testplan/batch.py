@@ -0,0 +1,172 @@
+import contextvars
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+try:
+    import yaml
+except ImportError:  # Manifests can still be written as JSON
+    yaml = None
+
+from file_handling.file_reader_folder import extract_documents_from_folder
+from file_handling.document_export import export_test_plan
+from storage.plan_store import create_plan
+from nlp_pre_processing.keyword_extraction import extract_keywords
+from open_ai.openai_integration_updated import get_feature_context
+from open_ai.progress import ProgressReporter
+from open_ai.test_plan_engine import generate_sections, TEST_PLAN_SECTIONS, DEFAULT_MAX_WORKERS
+
+# Plans generated at the same time; their requests also share the client's rate limits
+DEFAULT_MAX_PLANS = 2
+# Requests in flight at the same time across all plans
+DEFAULT_MAX_REQUESTS = 16
+# Progress of the feature extraction requests of a plan is tracked as a section of this name
+FEATURE_EXTRACTION = 'Feature Extraction'
+
+# Requirements of an application, extracted once and shared by the plans of every model
+Corpus = namedtuple('Corpus', ['document_texts', 'file_names', 'user_stories_text', 'keywords'])
+
+# Team counts of a manifest entry and the plan options they fill
+TEAM_OPTIONS = {
+    'testers': 'num_testers',
+    'test_leads': 'num_test_lead',
+    'test_managers': 'num_test_managers',
+    'automation_testers': 'num_automation_testers',
+    'performance_testers': 'num_performance_testers',
+    'security_testers': 'num_security_testers',
+}
+
+
+def load_manifest(path):
+    """Read a manifest (YAML or JSON) and return its applications, each merged over the manifest's defaults.
+
+    The manifest is either a list of applications or a mapping with an 'applications'
+    list and optional 'defaults' (e.g. the model, created_by or team counts).
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("PyYAML is required to read YAML manifests; install it or use a JSON manifest.")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'applications': manifest}
+    defaults = manifest.get('defaults', {})
+    applications = []
+    for entry in manifest.get('applications', []):
+        application = dict(defaults, **entry)
+        application['team'] = dict(defaults.get('team', {}), **entry.get('team', {}))
+        if not application.get('name') or not application.get('documents'):
+            raise ValueError(f"Every application needs a name and a documents directory: {entry}")
+        applications.append(application)
+    return applications
+
+
+def plan_options(application, file_names, feature_context, keywords):
+    """Build the options the section generators take, as the app builds them from its form."""
+    team = application['team']
+    options = {
+        'application_name': application['name'],
+        'created_by': application.get('created_by', ''),
+        'creation_date': str(application.get('creation_date', date.today().isoformat())),
+        'domain': application.get('domain', ''),
+        'tech_stack': application.get('tech_stack', {}),
+        'keywords': ', '.join(keywords),
+        'features': feature_context.features,
+        'criticalities': feature_context.criticalities,
+        # YAML reads unquoted dates as dates, the form stores them as 'YYYY-MM-DD' (or 'To be Decided')
+        'approvers': [dict(person, date=str(person.get('date', 'To be Decided')))
+                      for person in application.get('approvers', [])],
+        'reviewers': [dict(person, date=str(person.get('date', 'To be Decided')))
+                      for person in application.get('reviewers', [])],
+        'file_names': file_names,
+        'urls': application.get('urls', []),
+    }
+    options.update({option: int(team.get(key, 0)) for key, option in TEAM_OPTIONS.items()})
+    options['test_automation'] = options['num_automation_testers'] > 0
+    options['performance_testing'] = options['num_performance_testers'] > 0
+    options['security_testing'] = options['num_security_testers'] > 0
+    return options
+
+
+def prepare_corpus(directory):
+    """Extract the requirement texts of a documents directory and their keywords."""
+    documents = extract_documents_from_folder(directory)
+    document_texts = [document['Text'] for document in documents if document['Text']]
+    if not document_texts:
+        raise ValueError(f"No text could be extracted from {directory}")
+    file_names = [document['File'] for document in documents if document['Text']]
+    user_stories_text = "\n\n".join(document_texts)
+    keywords = extract_keywords(user_stories_text, documents=document_texts)
+    return Corpus(document_texts, file_names, user_stories_text, keywords)
+
+
+def generate_plan(application, engine, api_key, max_workers=DEFAULT_MAX_WORKERS, corpus=None):
+    """Generate, export and record the plan of one manifest entry and return (summary, section_details).
+
+    The corpus is extracted from the entry's documents directory unless one is given. The
+    summary holds the prompt and completion tokens of the feature extraction requests; those
+    of the sections are in section_details.
+    """
+    start_time = time.time()
+    corpus = corpus or prepare_corpus(application['documents'])
+    reporter = ProgressReporter()
+    # Features are extracted by the model itself, so each model gets its own feature context
+    feature_context = reporter.track(FEATURE_EXTRACTION, get_feature_context, engine, corpus.user_stories_text,
+                                     api_key, documents=corpus.document_texts)
+    feature_usage = reporter.section_metrics(FEATURE_EXTRACTION)
+    options = plan_options(application, corpus.file_names, feature_context, corpus.keywords)
+
+    full_test_plan = {}
+    section_details = []
+    for _, section, content, timings in generate_sections(TEST_PLAN_SECTIONS, engine, api_key,
+                                                         corpus.user_stories_text, options,
+                                                         feature_context=feature_context, max_workers=max_workers,
+                                                         reporter=reporter):
+        full_test_plan[section] = content
+        section_details.append({"Section": section, "Content": content, "Word Count": len(content.split()),
+                                **timings})
+
+    exported_plan = export_test_plan(full_test_plan, application['name'], engine)
+    exported_plan.saved.result()
+    session_id, doc_gen_id = create_plan(application['name'], engine, exported_plan.path, section_details,
+                                         plan_hash=exported_plan.plan_hash)
+    summary = {'application': application['name'], 'model': engine, 'path': exported_plan.path,
+               'session_id': session_id, 'doc_gen_id': doc_gen_id, 'sections': len(section_details),
+               'feature_prompt_tokens': feature_usage["Prompt Tokens"],
+               'feature_completion_tokens': feature_usage["Completion Tokens"],
+               'elapsed': time.time() - start_time}
+    return summary, section_details
+
+
+def run_manifest(applications, api_key, default_engine=None, max_plans=DEFAULT_MAX_PLANS,
+                 max_workers=DEFAULT_MAX_WORKERS):
+    """Generate the plans of all applications, max_plans at a time, and return one result per application.
+
+    A failed plan does not stop the others; its result carries the error instead.
+    """
+    def run(application):
+        engine = application.get('model', default_engine)
+        try:
+            result, _ = generate_plan(application, engine, api_key, max_workers)
+            print(f"Generated the test plan of {application['name']} in {result['elapsed']:.1f}s: {result['path']}")
+            return result
+        except Exception as e:
+            print(f"Failed to generate the test plan of {application['name']}: {str(e)}")
+            return {'application': application['name'], 'model': engine, 'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_plans), thread_name_prefix="plan") as executor:
+        # Every plan runs in a copy of the caller's context, which holds the cache and streaming settings
+        futures = [executor.submit(contextvars.copy_context().run, run, application) for application in applications]
+        return [future.result() for future in futures]
+
+
+def write_report(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
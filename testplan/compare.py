@@ -0,0 +1,95 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from open_ai.model_catalog import estimate_cost
+from open_ai.test_plan_engine import DEFAULT_MAX_WORKERS
+from reporting.feedback_dataset import analysis_path, COMPARISON_FILE, COMPARISON_SECTIONS_FILE
+from testplan.batch import generate_plan, prepare_corpus
+
+# Per-section metrics kept in the sections table, next to Application Name, Model Name and Section
+SECTION_METRICS = ["Word Count", "Generation Time", "Time to First Token", "Tokens per Second", "Prompt Tokens",
+                   "Completion Tokens", "Cached"]
+
+
+def _model_row(engine, summary, sections):
+    # The plan's tokens are those of its sections and of the feature extraction before them. Sections served from
+    # the response cache cost nothing, like cached feature chunks, so their tokens are only reported apart
+    cached = sections["Cached"].fillna(False).astype(bool)
+    cached_tokens = int(sections.loc[cached, ["Prompt Tokens", "Completion Tokens"]].sum().sum())
+    feature_tokens = summary['feature_prompt_tokens'] + summary['feature_completion_tokens']
+    prompt_tokens = int(sections.loc[~cached, "Prompt Tokens"].sum()) + summary['feature_prompt_tokens']
+    completion_tokens = int(sections.loc[~cached, "Completion Tokens"].sum()) + summary['feature_completion_tokens']
+    return {
+        "Model Name": engine,
+        "Plan Time": summary['elapsed'],
+        "Total Generation Time": sections["Generation Time"].sum(),
+        "Average Generation Time": sections["Generation Time"].mean(),
+        # Cached sections have no latencies (NaN), so the averages are over the sections sent to the API
+        "Average Time to First Token": sections["Time to First Token"].mean(),
+        "Average Tokens per Second": sections["Tokens per Second"].mean(),
+        "Cached Sections": int(cached.sum()),
+        "Prompt Tokens": prompt_tokens,
+        "Completion Tokens": completion_tokens,
+        "Feature Extraction Tokens": feature_tokens,
+        "Cached Tokens": cached_tokens,
+        "Estimated Cost": estimate_cost(engine, prompt_tokens, completion_tokens),
+        "Word Count": int(sections["Word Count"].sum()),
+        "Test Plan": summary['path'],
+        "Session ID": summary['session_id'],
+        "Error": None,
+    }
+
+
+def compare_models(application, engines, api_key, max_workers=DEFAULT_MAX_WORKERS):
+    """Generate the plan of one application with every engine and return (models table, sections table).
+
+    The documents are extracted and their keywords computed once; the plans of all engines
+    are then generated at the same time, each model waiting only for its own rate limits.
+    Every plan is exported and recorded like any other. The models table has one row per
+    engine with its latency, tokens and estimated cost (of the sections and the feature
+    extraction), the sections table one row per engine and section. Sections served from
+    the response cache are counted in "Cached Sections", their tokens in "Cached Tokens";
+    they are left out of the token totals, the cost and the latency averages.
+    """
+    start_time = time.time()
+    corpus = prepare_corpus(application['documents'])
+    print(f"Extracted {len(corpus.document_texts)} documents in {time.time() - start_time:.1f}s")
+
+    def run(engine):
+        try:
+            return generate_plan(application, engine, api_key, max_workers, corpus=corpus)
+        except Exception as e:
+            print(f"Failed to generate the test plan of {application['name']} with {engine}: {str(e)}")
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, len(engines)), thread_name_prefix="model") as executor:
+        futures = [executor.submit(contextvars.copy_context().run, run, engine) for engine in engines]
+        results = [future.result() for future in futures]
+
+    model_rows, section_frames = [], []
+    for engine, result in zip(engines, results):
+        if isinstance(result, Exception):
+            model_rows.append({"Model Name": engine, "Error": str(result)})
+            continue
+        summary, section_details = result
+        sections = pd.DataFrame(section_details).reindex(columns=["Section"] + SECTION_METRICS)
+        sections[SECTION_METRICS] = sections[SECTION_METRICS].apply(pd.to_numeric, errors='coerce')
+        model_rows.append(_model_row(engine, summary, sections))
+        section_frames.append(sections.assign(**{"Application Name": application['name'], "Model Name": engine}))
+    models = pd.DataFrame(model_rows)
+    sections = (pd.concat(section_frames, ignore_index=True) if section_frames
+                else pd.DataFrame(columns=["Section"] + SECTION_METRICS + ["Application Name", "Model Name"]))
+    sections = sections[["Application Name", "Model Name", "Section"] + SECTION_METRICS]
+    return models, sections
+
+
+def save_comparison(application_name, models, sections):
+    """Write both tables next to the other analyses of the application and return their paths."""
+    models_path = analysis_path(application_name, COMPARISON_FILE)
+    sections_path = analysis_path(application_name, COMPARISON_SECTIONS_FILE)
+    models.to_csv(models_path, index=False)
+    sections.to_csv(sections_path, index=False)
+    return models_path, sections_path
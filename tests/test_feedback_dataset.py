@@ -0,0 +1,32 @@
+import pytest
+
+from reporting import feedback_dataset
+from storage.plan_store import create_plan, save_feedback, export_legacy_feedback
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    """Point the feedback dataset at an empty feedback directory, dataset and store under tmp_path."""
+    monkeypatch.setattr(feedback_dataset, 'FEEDBACK_DIR', str(tmp_path / 'feedback'))
+    monkeypatch.setattr(feedback_dataset, 'DATASET_DIR', str(tmp_path / 'dataset'))
+    monkeypatch.setattr(feedback_dataset, 'MANIFEST_FILE', str(tmp_path / 'dataset' / 'manifest.json'))
+    monkeypatch.setattr(feedback_dataset, 'STORE_DB_FILE', str(tmp_path / 'session_data.db'))
+    return tmp_path
+
+
+def test_exported_feedback_is_not_ingested_twice(dataset):
+    db_file = feedback_dataset.STORE_DB_FILE
+    sections = [{"Section": "Introduction", "Content": "Intro text", "Word Count": 2, "Generation Time": 1.5}]
+    _, plan_id = create_plan('Demo', 'gpt-4', 'Demo_Test_Plan_gpt-4.docx', sections, db_file=db_file)
+    save_feedback(plan_id, 'gpt-4', [
+        {"Section": "Introduction", "Detail Rating": 4, "Clarity Rating": 5, "Relevance Rating": 3},
+        {"Section": "Overall Feedback", "Overall Quality": 4},
+    ], db_file=db_file)
+
+    before = feedback_dataset.load_feedback_data('Demo')
+    assert len(before) == 2
+
+    exported = export_legacy_feedback(base_dir=feedback_dataset.FEEDBACK_DIR, db_file=db_file)
+    assert len(exported) == 1
+    after = feedback_dataset.load_feedback_data('Demo')
+    assert len(after) == len(before)